@@ -11,6 +11,8 @@ import models.dbmodel
 
 import controllers.routes
 
+import controllers.commands
+
 
 if __name__=='__main__':
     app.run()
@@ -0,0 +1,165 @@
+# archive.py
+# moves old booking_history rows to per-month gzip JSONL files under
+# HISTORY_ARCHIVE_DIR (instance/history_archive by default) so the hot table and
+# its indexes stay small. Rows go in batches: a batch is appended to the month
+# files (one gzip member per write, fsynced) before it is deleted from the table.
+# A crash in between can leave a row in both, readers skip rows already seen.
+# Files written before booking_history had AUTOINCREMENT can hold two rows with
+# the same id, so a row is identified by archive_key() (id, user and booking
+# time), never by its id alone. The files are not rewritten when a user is
+# deleted: user ids are never reused, so nobody reads those records again.
+import gzip
+import json
+import os
+from datetime import datetime, date
+from decimal import Decimal
+from types import SimpleNamespace
+from sqlalchemy import select, delete, func
+from app import app
+from models.dbmodel import db, UserHistory, ParkingSpot, ParkingLot, HistoryArchiveMonth
+from .history import HISTORY_PAGE_SIZE
+
+
+def get_archive_dir():
+    return app.config['HISTORY_ARCHIVE_DIR'] or os.path.join(app.instance_path, 'history_archive')
+
+
+def archive_path(month):
+    return os.path.join(get_archive_dir(), f"history-{month}.jsonl.gz")
+
+
+def archive_cutoff(months, today=None):
+    """first day of the month `months` months before the current one, rows booked before it are archived"""
+    today = today or date.today()
+    year, month = divmod(today.year * 12 + (today.month - 1) - months, 12)
+    return datetime(year, month + 1, 1)
+
+
+def archive_key(record):
+    return (record['id'], record['user_id'], record['booking_time'])
+
+
+def _archive_record(row):
+    return {
+        'id': row.id,
+        'user_id': row.user_id,
+        'spot_id': row.spot_id,
+        'lot_id': row.lot_id,
+        'address': row.address, # kept, the spot or lot may be deleted later
+        'booking_time': row.booking_time.isoformat(),
+        'leaving_time': row.leaving_time.isoformat(),
+        'parking_cost': str(row.parking_cost),
+        'vehicle_no': row.vehicle_no
+    }
+
+
+def archive_history(months=None, batch_size=None):
+    """
+    archives history rows booked before archive_cutoff(months), batch by batch.
+    Returns {month: rows archived}.
+    """
+    months = app.config['HISTORY_ARCHIVE_MONTHS'] if months is None else months
+    batch_size = batch_size or app.config['HISTORY_ARCHIVE_BATCH_SIZE']
+    cutoff = archive_cutoff(months)
+    os.makedirs(get_archive_dir(), exist_ok=True)
+
+    archived = {}
+    while True:
+        batch = db.session.execute(
+            select(UserHistory.id, UserHistory.user_id, UserHistory.spot_id, UserHistory.booking_time,
+                   UserHistory.leaving_time, UserHistory.parking_cost, UserHistory.vehicle_no,
+                   ParkingSpot.lot_id, ParkingLot.address)
+            .outerjoin(ParkingSpot, ParkingSpot.spot_id == UserHistory.spot_id)
+            .outerjoin(ParkingLot, ParkingLot.lot_id == ParkingSpot.lot_id)
+            .where(UserHistory.booking_time < cutoff)
+            .order_by(UserHistory.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+
+        by_month = {}
+        for row in batch:
+            by_month.setdefault(row.booking_time.strftime('%Y-%m'), []).append(_archive_record(row))
+
+        for month, records in by_month.items():
+            with open(archive_path(month), 'ab') as raw_file:
+                with gzip.GzipFile(fileobj=raw_file, mode='wb') as archive_file:
+                    archive_file.write(''.join(json.dumps(record) + '\n' for record in records).encode('utf-8'))
+                raw_file.flush()
+                os.fsync(raw_file.fileno())
+
+            archive_month = db.session.get(HistoryArchiveMonth, month)
+            if archive_month is None:
+                archive_month = HistoryArchiveMonth(month=month, row_count=0)
+                db.session.add(archive_month)
+            archive_month.row_count += len(records)
+            archive_month.archived_at = datetime.now()
+            archived[month] = archived.get(month, 0) + len(records)
+
+        db.session.execute(
+            delete(UserHistory)
+            .where(UserHistory.id.in_([row.id for row in batch]))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if len(batch) < batch_size:
+            break
+    return archived
+
+
+def get_archived_months():
+    """archived months, newest first"""
+    return [row.month for row in HistoryArchiveMonth.query.order_by(HistoryArchiveMonth.month.desc())]
+
+
+def get_archived_row_count(session=None):
+    session = session or db.session
+    return session.query(func.coalesce(func.sum(HistoryArchiveMonth.row_count), 0)).scalar()
+
+
+def _as_history_record(record):
+    """archive record shaped like a UserHistory row for the history templates"""
+    spot_obj = None
+    if record['spot_id'] is not None:
+        lot = SimpleNamespace(address=record['address']) if record['address'] is not None else None
+        spot_obj = SimpleNamespace(spot_id=record['spot_id'], lot=lot)
+    return SimpleNamespace(
+        id=record['id'],
+        user_id=record['user_id'],
+        spot_obj=spot_obj,
+        booking_time=datetime.fromisoformat(record['booking_time']),
+        leaving_time=datetime.fromisoformat(record['leaving_time']),
+        parking_cost=Decimal(record['parking_cost']),
+        vehicle_no=record['vehicle_no']
+    )
+
+
+def get_archived_history_page(user_id, month, before_id=None, date_from=None, date_to=None, limit=HISTORY_PAGE_SIZE):
+    """
+    same contract as history.get_history_page, read from the archive file of one month
+    (a cold path: the file is scanned for the user's rows).
+    """
+    path = archive_path(month)
+    if not os.path.exists(path):
+        return [], None
+
+    records = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as archive_file:
+        for line in archive_file:
+            record = json.loads(line)
+            if record['user_id'] != user_id or (before_id is not None and record['id'] >= before_id):
+                continue
+            records[archive_key(record)] = record # a re-archived row keeps one copy
+
+    page = []
+    for record in sorted(records.values(), key=lambda record: record['id'], reverse=True):
+        history_record = _as_history_record(record)
+        if date_from is not None and history_record.booking_time.date() < date_from:
+            continue
+        if date_to is not None and history_record.booking_time.date() > date_to:
+            continue
+        page.append(history_record)
+        if len(page) > limit:
+            return page[:limit], page[limit - 1].id
+    return page, None
@@ -0,0 +1,69 @@
+# availability.py
+# set-based spot availability for a lot and a time window, used by book_spot
+from sqlalchemy import and_, exists, select
+from models.dbmodel import db, UserBookings, ParkingSpot
+
+
+def overlaps_window(parking_time, leaving_time):
+    """
+    a booking overlaps [parking_time, leaving_time) if it starts before the window
+    ends and ends after the window starts.
+    """
+    return and_(UserBookings.parking_time < leaving_time, UserBookings.leaving_time > parking_time)
+
+
+def free_spot_ids_select(lot_id, parking_time, leaving_time):
+    """
+    select of the ids of the spots in the lot that have no booking overlapping
+    the window, lowest spot id first. One query (NOT EXISTS) whatever the size of the lot.
+    """
+    return select(ParkingSpot.spot_id).where(
+        ParkingSpot.lot_id == lot_id,
+        ~exists().where(
+            UserBookings.spot_id == ParkingSpot.spot_id,
+            overlaps_window(parking_time, leaving_time)
+        )
+    ).order_by(ParkingSpot.spot_id)
+
+
+def find_free_spot_ids(lot_id, parking_time, leaving_time, limit=None, session=None):
+    """ids of the free spots of the lot in the window, see free_spot_ids_select"""
+    stmt = free_spot_ids_select(lot_id, parking_time, leaving_time)
+    if limit:
+        stmt = stmt.limit(limit)
+    return list((session or db.session).scalars(stmt))
+
+
+def is_spot_free(lot_id, spot_id, parking_time, leaving_time):
+    """
+    True if the spot still exists in the lot and has no booking overlapping the window.
+    """
+    return db.session.query(
+        exists().where(
+            ParkingSpot.spot_id == spot_id,
+            ParkingSpot.lot_id == lot_id,
+            ~exists().where(
+                UserBookings.spot_id == ParkingSpot.spot_id,
+                overlaps_window(parking_time, leaving_time)
+            )
+        )
+    ).scalar()
+
+
+def find_conflicting_bookings(lot_id, parking_time, leaving_time):
+    """
+    bookings in the lot overlapping the window, grouped by spot, in the
+    shape book_spot.html shows them.
+    """
+    rows = db.session.query(
+        UserBookings.spot_id, UserBookings.parking_time, UserBookings.leaving_time
+    ).join(ParkingSpot).filter(
+        ParkingSpot.lot_id == lot_id,
+        overlaps_window(parking_time, leaving_time)
+    ).order_by(UserBookings.spot_id, UserBookings.parking_time).all()
+
+    return [{
+        'spot_id': row.spot_id,
+        'parking_time': row.parking_time.strftime('%Y-%m-%d %H:%M'),
+        'leaving_time': row.leaving_time.strftime('%Y-%m-%d %H:%M')
+    } for row in rows]
@@ -0,0 +1,56 @@
+# change_versions.py
+# keeps the per-process caches of each worker coherent: writers bump the version
+# of an entity class in change_versions (bump_versions, same transaction as the
+# write), and every worker polls that tiny table and drops the caches of the
+# entities whose version moved since its last look.
+import threading
+import time
+from app import app
+from models.dbmodel import db, ChangeVersion
+
+
+_invalidators = {} # entity -> [callback(), ...]
+_seen_versions = None # entity -> version at the last check, None before the first one
+_last_check_at = 0.0
+_check_lock = threading.Lock()
+
+
+def on_change(entity, callback):
+    """registers callback() to run when another write to entity is seen"""
+    _invalidators.setdefault(entity, []).append(callback)
+
+
+def seen_version(entity):
+    """version of entity at this worker's last check, None before the first one"""
+    return None if _seen_versions is None else _seen_versions.get(entity)
+
+
+def check_change_versions(force=False):
+    """
+    reads the change versions (one small SELECT) at most once per
+    CHANGE_VERSION_CHECK_SECONDS and runs the callbacks of every entity whose
+    version changed. Returns the entities found changed.
+    """
+    global _seen_versions, _last_check_at
+    if not force and time.monotonic() - _last_check_at < app.config['CHANGE_VERSION_CHECK_SECONDS']:
+        return []
+    if not _check_lock.acquire(blocking=force):
+        return [] # another thread of this worker is checking right now
+
+    try:
+        _last_check_at = time.monotonic()
+        versions = dict(db.session.query(ChangeVersion.entity, ChangeVersion.version).all())
+        if _seen_versions is None:
+            # first check of this process: its caches are empty, nothing to drop
+            _seen_versions = versions
+            return []
+
+        changed = [entity for entity, version in versions.items() if _seen_versions.get(entity) != version]
+        _seen_versions = versions
+    finally:
+        _check_lock.release()
+
+    for entity in changed:
+        for callback in _invalidators.get(entity, []):
+            callback()
+    return changed
@@ -0,0 +1,311 @@
+# commands.py
+# flask cli commands for maintenance jobs, run with `flask <command>`
+import click
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from app import app
+from models.dbmodel import db, ensure_indexes, refresh_lot_counters, User, ParkingLot, ParkingSpot, UserBookings
+from .sweeper import run_sweeper_forever, run_sweeper_tick, release_sweeper_lease
+from .availability import find_free_spot_ids
+from .slot_index import build_lot_index, slot_floor, invalidate_lot_index
+from .lot_stats import find_counter_drift
+from .retention import run_notification_retention
+from .archive import archive_history, archive_cutoff, get_archive_dir
+from .rollups import rebuild_rollups
+from .reporting import refresh_reporting_snapshot, reporting_enabled
+from .exports import EXPORT_DATASETS, EXPORT_FORMATS, iter_export
+from .lot_bulk import import_lots_csv, resize_lot
+from .user_purge import purge_inactive_users
+from .reference_data import invalidate_lot_reference_data
+from .table_migration import migrate_tables
+from .query_plans import check_hot_query_plans
+
+
+# -------------------------
+# BOOKING SWEEPER
+# -------------------------
+@app.cli.command('run-sweeper')
+@click.option('--interval', type=int, default=None, help="Seconds between sweeps (default SWEEPER_INTERVAL_SECONDS).")
+def run_sweeper_command(interval):
+    """Run the booking sweeper in the foreground (dedicated worker process)."""
+    click.echo("Booking sweeper started, press Ctrl+C to stop.")
+    try:
+        run_sweeper_forever(interval)
+    except KeyboardInterrupt:
+        with app.app_context():
+            release_sweeper_lease()
+        click.echo("Booking sweeper stopped.")
+
+
+@app.cli.command('sweep-once')
+def sweep_once_command():
+    """Run a single sweep if no other worker holds the sweeper lease."""
+    if run_sweeper_tick():
+        click.echo("Sweep completed.")
+    else:
+        click.echo("Sweep skipped, another worker holds the lease (or the sweep failed, see logs).")
+
+
+# -------------------------
+# SCHEMA INDEXES
+# -------------------------
+
+@app.cli.command('migrate-tables')
+def migrate_tables_command():
+    """Rebuild tables whose foreign keys or AUTOINCREMENT differ from the models (back up first)."""
+    rebuilt, released = migrate_tables()
+    for table_name in rebuilt:
+        click.echo(f"Rebuilt table {table_name}.")
+    if released:
+        click.echo(f"Moved {released} booking(s) without their spot or user to history.")
+    click.echo(f"{len(rebuilt)} table(s) rebuilt.")
+
+
+@app.cli.command('ensure-indexes')
+def ensure_indexes_command():
+    """Create declared indexes missing from an existing database."""
+    created = ensure_indexes()
+    for index_name in created:
+        click.echo(f"Created index {index_name}")
+    click.echo(f"{len(created)} index(es) created.")
+
+
+@app.cli.command('explain-indexes')
+def explain_indexes_command():
+    """Check with EXPLAIN QUERY PLAN that every hot query uses its index."""
+    failing = 0
+    for label, plan, problems in check_hot_query_plans(datetime.now()):
+        failing += bool(problems)
+        click.echo(f"[{'MISSING' if problems else 'OK'}] {label}: {' | '.join(plan)}")
+        for problem in problems:
+            click.echo(f"    {problem}")
+    if failing:
+        raise SystemExit(f"{failing} hot query(ies) do not use their index.")
+
+
+# -------------------------
+# LOT COUNTERS
+# -------------------------
+@app.cli.command('reconcile-lot-counters')
+@click.option('--fix', is_flag=True, help="Rewrite drifted counters from the source tables.")
+def reconcile_lot_counters_command(fix):
+    """Compare ParkingLot counters with parking_spot/user_bookings and report drift."""
+    drift = find_counter_drift()
+    for lot_id, drifted in drift:
+        details = ', '.join(f"{name} stored {stored} actual {actual}" for name, (stored, actual) in drifted.items())
+        click.echo(f"Lot {lot_id}: {details}")
+
+    if not drift:
+        click.echo("All lot counters match.")
+    elif fix:
+        refresh_lot_counters([lot_id for lot_id, _ in drift])
+        db.session.commit()
+        click.echo(f"Fixed counters of {len(drift)} lot(s).")
+    else:
+        click.echo(f"{len(drift)} lot(s) drifted, rerun with --fix to repair.")
+
+
+# -------------------------
+# NOTIFICATION RETENTION
+# -------------------------
+@app.cli.command('purge-notifications')
+@click.option('--days', type=int, default=None, help="Delete read notifications older than this (default NOTIFICATION_RETENTION_DAYS).")
+@click.option('--batch-size', type=int, default=None, help="Rows per transaction (default NOTIFICATION_RETENTION_BATCH_SIZE).")
+@click.option('--vacuum', is_flag=True, help="VACUUM afterwards to shrink the database file (locks it while running).")
+def purge_notifications_command(days, batch_size, vacuum):
+    """Delete old read notifications and merge duplicate unread ones."""
+    report = run_notification_retention(days, batch_size)
+    click.echo(f"Deleted {report['purged_read_rows']} old read notification(s), "
+               f"merged {report['merged_unread_rows']} duplicate unread notification(s).")
+    click.echo(f"Reclaimed {report['rows_reclaimed']} row(s), about {report['bytes_reclaimed']} bytes of row data. "
+               f"Free pages in the database file: {report['free_bytes']} bytes.")
+    if vacuum:
+        db.session.commit()
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql('VACUUM')
+        click.echo("Database vacuumed.")
+
+
+# -------------------------
+# HISTORY ARCHIVAL
+# -------------------------
+@app.cli.command('archive-history')
+@click.option('--months', type=int, default=None, help="Keep this many past months live (default HISTORY_ARCHIVE_MONTHS).")
+@click.option('--batch-size', type=int, default=None, help="Rows per transaction (default HISTORY_ARCHIVE_BATCH_SIZE).")
+def archive_history_command(months, batch_size):
+    """Move old booking history to per-month gzip JSONL archive files."""
+    months = app.config['HISTORY_ARCHIVE_MONTHS'] if months is None else months
+    archived = archive_history(months, batch_size)
+    for month, row_count in sorted(archived.items()):
+        click.echo(f"{month}: archived {row_count} row(s).")
+    click.echo(f"Archived {sum(archived.values())} history row(s) booked before "
+               f"{archive_cutoff(months):%Y-%m-%d} to {get_archive_dir()}.")
+
+
+# -------------------------
+# SUMMARY ROLLUPS
+# -------------------------
+@app.cli.command('backfill-rollups')
+def backfill_rollups_command():
+    """Rebuild the summary rollup tables from booking history and its archive files."""
+    lot_day_rows, user_lot_rows = rebuild_rollups()
+    click.echo(f"Rebuilt rollups: {lot_day_rows} lot/day row(s), {user_lot_rows} user/lot row(s).")
+
+
+# -------------------------
+# REPORTING SNAPSHOT
+# -------------------------
+@app.cli.command('refresh-reporting-snapshot')
+def refresh_reporting_snapshot_command():
+    """Copy the live database into the read-only reporting snapshot."""
+    if not reporting_enabled():
+        click.echo("Reporting snapshot is disabled, set REPORTING_SNAPSHOT_ENABLED=True.")
+        return
+    seconds = refresh_reporting_snapshot()
+    click.echo(f"Reporting snapshot written to {app.config['REPORTING_SNAPSHOT_PATH']} in {seconds:.2f}s.")
+
+
+# -------------------------
+# EXPORTS
+# -------------------------
+@app.cli.command('export')
+@click.argument('dataset', type=click.Choice(EXPORT_DATASETS))
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='csv')
+@click.option('--from', 'date_from', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help="First booking start date.")
+@click.option('--to', 'date_to', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help="Last booking start date.")
+@click.option('--lot-id', type=int, default=None)
+@click.option('--gzip', 'compress', is_flag=True, help="gzip the output.")
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), default='-', help="File to write (default stdout).")
+def export_command(dataset, fmt, date_from, date_to, lot_id, compress, output):
+    """Stream booking history or current bookings as CSV/JSON lines."""
+    chunks = iter_export(db.session, dataset, fmt,
+                         date_from.date() if date_from else None, date_to.date() if date_to else None,
+                         lot_id, compress)
+    with click.open_file(output, 'wb') as output_file:
+        for chunk in chunks:
+            output_file.write(chunk if compress else chunk.encode('utf-8'))
+
+
+# -------------------------
+# BULK LOT IMPORT
+# -------------------------
+@app.cli.command('import-lots')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--chunk-size', type=int, default=500, help="Rows per transaction.")
+def import_lots_command(csv_file, chunk_size):
+    """Import parking lots and their spots from a CSV file (see README for the columns)."""
+    started = time.perf_counter()
+    report = import_lots_csv(csv_file, chunk_size)
+    invalidate_lot_reference_data()
+    for line_no, message in report['errors']:
+        click.echo(f"line {line_no}: {message}")
+    click.echo(f"Imported {report['lots']} lot(s) with {report['spots']} spot(s) in "
+               f"{time.perf_counter() - started:.1f}s, {len(report['errors'])} row(s) rejected.")
+
+
+# -------------------------
+# LOT RESIZE
+# -------------------------
+@app.cli.command('resize-lot')
+@click.argument('lot_id', type=int)
+@click.argument('spots', type=int)
+def resize_lot_command(lot_id, spots):
+    """Grow or shrink a parking lot to SPOTS spots in one transaction."""
+    if not db.session.get(ParkingLot, lot_id):
+        raise click.ClickException(f"Parking lot {lot_id} not found.")
+    try:
+        report = resize_lot(lot_id, spots)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    invalidate_lot_index(lot_id)
+    invalidate_lot_reference_data(lot_id)
+    click.echo(f"Lot {lot_id}: {report['before']} -> {report['after']} spots "
+               f"({report['added']} added, {report['removed']} removed, "
+               f"{report['kept_booked']} kept because they are booked).")
+
+
+# -------------------------
+# INACTIVE USER PURGE
+# -------------------------
+@app.cli.command('purge-inactive-users')
+@click.option('--months', type=int, default=None, help="Inactive for this many months (default USER_INACTIVE_MONTHS).")
+@click.option('--batch-size', type=int, default=None, help="Users per transaction (default USER_PURGE_BATCH_SIZE).")
+@click.option('--pause', type=float, default=0.05, help="Seconds between batches, for other writers.")
+@click.confirmation_option(prompt="Permanently delete inactive users with their history?")
+def purge_inactive_users_command(months, batch_size, pause):
+    """Delete users without bookings who have been inactive for N months, in batches (rerun to resume)."""
+    started = time.perf_counter()
+
+    def progress(purged, total):
+        click.echo(f"purged {purged}/{total} user(s)")
+
+    purged = purge_inactive_users(months, batch_size, pause, on_batch=progress)
+    click.echo(f"Purged {purged} inactive user(s) in {time.perf_counter() - started:.1f}s.")
+
+
+# -------------------------
+# SLOT BITMAP BENCHMARK
+# -------------------------
+@app.cli.command('bench-slot-index')
+@click.option('--spots', type=int, default=5000, help="Spots in the scratch lot.")
+@click.option('--bookings', type=int, default=20000, help="Random bookings spread over the next 10 days.")
+@click.option('--queries', type=int, default=200, help="Random windows to look up.")
+def bench_slot_index_command(spots, bookings, queries):
+    """Time bitmap vs SQL availability on a scratch lot in a temporary database."""
+    rng = random.Random(42)
+    now = datetime.now()
+
+    def random_window():
+        start = now + timedelta(minutes=rng.randrange(10, 10 * 24 * 60))
+        return start, start + timedelta(minutes=rng.randrange(30, 6 * 60))
+
+    # never the configured database: the inserts would hold its write lock for the whole run
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}")
+        try:
+            db.metadata.create_all(engine)
+            with Session(engine) as session:
+                user = User(email_id='bench@localhost', pass_wd='-', user_name='Benchmark')
+                lot = ParkingLot(area_type='Open', city='Benchmark', primelocation_name='Benchmark Lot',
+                                 price_per_hr=1.0, address='benchmark', pincode='000000')
+                session.add_all([user, lot])
+                session.flush()
+                session.execute(insert(ParkingSpot), [{'lot_id': lot.lot_id, 'status': 'A'}] * spots)
+                spot_ids = [row.spot_id for row in session.query(ParkingSpot.spot_id).filter_by(lot_id=lot.lot_id)]
+                booking_rows = []
+                for _ in range(bookings):
+                    start, end = random_window()
+                    booking_rows.append({'user_id': user.user_id, 'spot_id': rng.choice(spot_ids), 'parking_time': start,
+                                         'leaving_time': end, 'parking_cost': 1, 'vehicle_no': 'BENCH'})
+                session.execute(insert(UserBookings), booking_rows)
+                session.commit()
+                click.echo(f"Scratch lot {lot.lot_id}: {spots} spots, {bookings} bookings.")
+
+                started = time.perf_counter()
+                index = build_lot_index(lot.lot_id, now, session)
+                click.echo(f"Index build: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+                windows = [random_window() for _ in range(queries)]
+                for label, limit in (("first free spot", 1), ("all free spots", None)):
+                    started = time.perf_counter()
+                    sql_results = [find_free_spot_ids(lot.lot_id, start, end, limit, session) for start, end in windows]
+                    sql_ms = (time.perf_counter() - started) * 1000 / queries
+
+                    started = time.perf_counter()
+                    index.slide_to(slot_floor(now))
+                    bitmap_results = [index.free_spot_ids(start, end, limit) for start, end in windows]
+                    bitmap_ms = (time.perf_counter() - started) * 1000 / queries
+
+                    # the bitmap is conservative: whatever it reports free must be free in sql too
+                    all_free = ([set(find_free_spot_ids(lot.lot_id, start, end, session=session)) for start, end in windows]
+                                if limit else map(set, sql_results))
+                    consistent = all(set(found) <= free for found, free in zip(bitmap_results, all_free))
+                    click.echo(f"{label}: sql {sql_ms:.3f} ms/query, bitmap {bitmap_ms:.3f} ms/query "
+                               f"({sql_ms / bitmap_ms if bitmap_ms else float('inf'):.0f}x), consistent={consistent}")
+        finally:
+            engine.dispose()
@@ -7,3 +7,52 @@ load_dotenv()
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS']= os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS')
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+
+# background booking sweeper (activation/expiry), see controllers/sweeper.py
+app.config['SWEEPER_ENABLED'] = os.getenv('SWEEPER_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+app.config['SWEEPER_INTERVAL_SECONDS'] = int(os.getenv('SWEEPER_INTERVAL_SECONDS', 30))
+app.config['SWEEPER_LEASE_SECONDS'] = int(os.getenv('SWEEPER_LEASE_SECONDS', 90))
+app.config['SWEEPER_MAX_SKIP_SECONDS'] = int(os.getenv('SWEEPER_MAX_SKIP_SECONDS', 120))
+
+# in-memory slot bitmap used for availability checks, see controllers/slot_index.py
+app.config['SLOT_INDEX_MAX_AGE_SECONDS'] = int(os.getenv('SLOT_INDEX_MAX_AGE_SECONDS', 60))
+
+# process-local cache of lot reference data (cities, lots, search results), see controllers/reference_data.py
+app.config['REFERENCE_CACHE_TTL_SECONDS'] = int(os.getenv('REFERENCE_CACHE_TTL_SECONDS', 300))
+app.config['REFERENCE_CACHE_MAX_ENTRIES'] = int(os.getenv('REFERENCE_CACHE_MAX_ENTRIES', 1024))
+
+# how often a worker polls change_versions to drop caches made stale by other workers, 0 = every request
+app.config['CHANGE_VERSION_CHECK_SECONDS'] = float(os.getenv('CHANGE_VERSION_CHECK_SECONDS', 1))
+
+# per-worker cache of the logged in user, 0 disables it, see controllers/user_cache.py
+app.config['USER_CACHE_TTL_SECONDS'] = int(os.getenv('USER_CACHE_TTL_SECONDS', 30))
+app.config['USER_CACHE_MAX_ENTRIES'] = int(os.getenv('USER_CACHE_MAX_ENTRIES', 4096))
+
+# notification retention, see controllers/retention.py (interval 0 = only via `flask purge-notifications`)
+app.config['NOTIFICATION_RETENTION_DAYS'] = int(os.getenv('NOTIFICATION_RETENTION_DAYS', 30))
+app.config['NOTIFICATION_RETENTION_BATCH_SIZE'] = int(os.getenv('NOTIFICATION_RETENTION_BATCH_SIZE', 1000))
+app.config['NOTIFICATION_RETENTION_INTERVAL_SECONDS'] = int(os.getenv('NOTIFICATION_RETENTION_INTERVAL_SECONDS', 3600))
+
+# booking history archival, see controllers/archive.py (empty dir = instance/history_archive)
+app.config['HISTORY_ARCHIVE_MONTHS'] = int(os.getenv('HISTORY_ARCHIVE_MONTHS', 12))
+app.config['HISTORY_ARCHIVE_BATCH_SIZE'] = int(os.getenv('HISTORY_ARCHIVE_BATCH_SIZE', 1000))
+app.config['HISTORY_ARCHIVE_DIR'] = os.getenv('HISTORY_ARCHIVE_DIR', '')
+
+# inactive user purge, see controllers/user_purge.py (last_active_at is written at most once per touch interval)
+app.config['USER_INACTIVE_MONTHS'] = int(os.getenv('USER_INACTIVE_MONTHS', 12))
+app.config['USER_PURGE_BATCH_SIZE'] = int(os.getenv('USER_PURGE_BATCH_SIZE', 500))
+app.config['USER_ACTIVITY_TOUCH_SECONDS'] = int(os.getenv('USER_ACTIVITY_TOUCH_SECONDS', 3600))
+
+# read-only reporting snapshot for admin read views, see controllers/reporting.py
+app.config['REPORTING_SNAPSHOT_ENABLED'] = os.getenv('REPORTING_SNAPSHOT_ENABLED', 'False').lower() in ('1', 'true', 'yes')
+app.config['REPORTING_SNAPSHOT_PATH'] = os.getenv('REPORTING_SNAPSHOT_PATH') or os.path.join(app.instance_path, 'reporting_snapshot.db')
+app.config['REPORTING_SNAPSHOT_INTERVAL_SECONDS'] = int(os.getenv('REPORTING_SNAPSHOT_INTERVAL_SECONDS', 300))
+if app.config['REPORTING_SNAPSHOT_ENABLED']:
+    # opened read-only, a fresh connection per checkout so a replaced snapshot file is picked up
+    from sqlalchemy.pool import NullPool
+    app.config['SQLALCHEMY_BINDS'] = {
+        'reporting': {
+            'url': f"sqlite:///file:{os.path.abspath(app.config['REPORTING_SNAPSHOT_PATH'])}?mode=ro&uri=true",
+            'poolclass': NullPool
+        }
+    }
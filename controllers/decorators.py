@@ -1,7 +1,8 @@
 from functools import wraps
 from flask import flash, redirect, url_for, abort, session, current_app
-from models.dbmodel import User 
 from slugify import slugify 
+from .user_cache import get_request_user
+from .user_purge import note_user_activity
 
 
 # --------------------------- removing redundant checks with decorators-------------------------------------
@@ -53,8 +54,8 @@ def user_access_required(f):
                 "without 'user_id' in its URL arguments."
             )
             abort(500, description="Internal error: User ID missing from URL.")
-        #2
-        user = User.query.get(user_id_from_url)  
+        #2 (loaded once per request, from the per-worker user cache when possible)
+        user = get_request_user(user_id_from_url)
         if not user:
             flash("User not found!", "danger")
             return redirect(url_for('login'))
@@ -63,6 +64,7 @@ def user_access_required(f):
         if current_session_user_id != user.user_id:
             flash(f"Session changed! Please login again", "warning")
             return redirect(url_for('login'))
+        note_user_activity(user.user_id) # keeps the user out of the inactive purge
             
         # if all checks pass, inject the user object
         kwargs['user'] = user 
@@ -0,0 +1,133 @@
+# exports.py
+# streaming CSV/JSONL dumps of booking_history and user_bookings joined with spot,
+# lot and user data. Rows come from the db in keyset batches (id > last id), each
+# read in its own short transaction, and go out as they are formatted (optionally
+# gzip compressed on the fly). Memory stays flat however many rows match, and no
+# read lock is held while a slow client downloads, so booking commits go through.
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import select
+from models.dbmodel import UserHistory, UserBookings, ParkingSpot, ParkingLot, User
+
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_DATASETS = ('history', 'bookings')
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+def _export_select(dataset):
+    """(select, start time column, id column) of the dataset, one output row per booking"""
+    if dataset == 'history':
+        model, start_time = UserHistory, UserHistory.booking_time
+    else:
+        model, start_time = UserBookings, UserBookings.parking_time
+
+    stmt = (
+        select(
+            model.id,
+            model.user_id,
+            User.user_name,
+            User.email_id,
+            model.spot_id,
+            ParkingSpot.lot_id,
+            ParkingLot.primelocation_name,
+            ParkingLot.city,
+            ParkingLot.pincode,
+            start_time.label('start_time'),
+            model.leaving_time,
+            model.parking_cost,
+            model.vehicle_no
+        )
+        # outer joins: rows of deleted spots, lots or users are still exported
+        .outerjoin(User, User.user_id == model.user_id)
+        .outerjoin(ParkingSpot, ParkingSpot.spot_id == model.spot_id)
+        .outerjoin(ParkingLot, ParkingLot.lot_id == ParkingSpot.lot_id)
+        .order_by(model.id)
+    )
+    return stmt, start_time, model.id
+
+
+def iter_export_rows(session, dataset, date_from=None, date_to=None, lot_id=None):
+    """rows (as mappings) of the dataset with a start date in [date_from, date_to], optionally of one lot"""
+    stmt, start_time, id_column = _export_select(dataset)
+    if date_from is not None:
+        stmt = stmt.where(start_time >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        stmt = stmt.where(start_time < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if lot_id is not None:
+        stmt = stmt.where(ParkingSpot.lot_id == lot_id)
+
+    last_id = 0
+    while True:
+        batch = session.execute(stmt.where(id_column > last_id).limit(EXPORT_BATCH_SIZE)).mappings().all()
+        # ends the read transaction before the batch is sent, the client may be slow
+        session.rollback()
+        yield from batch
+        if len(batch) < EXPORT_BATCH_SIZE:
+            break
+        last_id = batch[-1]['id']
+
+
+def export_columns(dataset):
+    stmt, _, _ = _export_select(dataset)
+    return [column.name for column in stmt.selected_columns]
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def iter_csv(rows, columns):
+    """CSV text chunks, a header line then one chunk per EXPORT_BATCH_SIZE rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([row[column] for column in columns])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl(rows, columns):
+    """JSON lines text chunks, one chunk per EXPORT_BATCH_SIZE rows"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({column: _json_value(row[column]) for column in columns}))
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_gzip(chunks):
+    """gzip compresses text chunks on the fly (wbits=31 writes the gzip header and trailer)"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode('utf-8'))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_export(session, dataset, fmt='csv', date_from=None, date_to=None, lot_id=None, compress=False):
+    """the whole export as a stream of chunks, bytes when compress else str"""
+    columns = export_columns(dataset)
+    rows = iter_export_rows(session, dataset, date_from, date_to, lot_id)
+    chunks = iter_csv(rows, columns) if fmt == 'csv' else iter_jsonl(rows, columns)
+    return iter_gzip(chunks) if compress else chunks
+
+
+def export_filename(dataset, fmt, compress=False):
+    return f"parkalot-{dataset}-{datetime.now():%Y%m%d-%H%M%S}.{fmt}" + ('.gz' if compress else '')
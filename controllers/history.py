@@ -0,0 +1,52 @@
+# history.py
+# keyset pagination of a user's booking history, newest first.
+# Pages walk ix_booking_history_user_id (user_id, id) from a cursor
+# (WHERE id < :before), so page N costs the same as page 1. Also the user's
+# current bookings, listed above the recent history on the home page.
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from models.dbmodel import db, UserBookings, UserHistory, ParkingSpot
+
+
+HISTORY_PAGE_SIZE = 25
+
+
+def history_page_select(user_id, before_id=None, date_from=None, date_to=None, limit=HISTORY_PAGE_SIZE):
+    """
+    select of up to `limit` history records of the user with id < before_id, newest
+    first, optionally only bookings starting on/after date_from and on/before date_to (dates).
+    """
+    stmt = select(UserHistory).options(
+        joinedload(UserHistory.spot_obj).joinedload(ParkingSpot.lot) # location column, no lazy load per row
+    ).where(UserHistory.user_id == user_id)
+    if before_id is not None:
+        stmt = stmt.where(UserHistory.id < before_id)
+    if date_from is not None:
+        stmt = stmt.where(UserHistory.booking_time >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        stmt = stmt.where(UserHistory.booking_time < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return stmt.order_by(UserHistory.id.desc()).limit(limit)
+
+
+def get_history_page(user_id, before_id=None, date_from=None, date_to=None, limit=HISTORY_PAGE_SIZE):
+    """
+    a page of the user's history, see history_page_select.
+    Returns (records, next_cursor), next_cursor is None on the last page.
+    """
+    # one extra row tells whether there is a next page
+    records = db.session.scalars(history_page_select(user_id, before_id, date_from, date_to, limit + 1)).all()
+    if len(records) > limit:
+        return records[:limit], records[limit - 1].id
+    return records, None
+
+
+def get_recent_history(user_id, limit=5):
+    """the latest `limit` history records of the user, same index path as the pages"""
+    records, _ = get_history_page(user_id, limit=limit)
+    return records
+
+
+def current_bookings_select(user_id):
+    """the user's bookings not yet moved to history (ix_user_bookings_user_id)"""
+    return select(UserBookings).where(UserBookings.user_id == user_id)
@@ -0,0 +1,201 @@
+# lot_bulk.py
+# bulk parking lot/spot writes: CSV import of lots with their spots, resizing a
+# lot, and inserting many spots at once, instead of one ORM object per lot or spot.
+import csv
+from datetime import datetime
+from sqlalchemy import delete, func, insert, select, text
+from app import app
+from models.dbmodel import db, ParkingLot, ParkingSpot, UserBookings, bump_versions, refresh_lot_counters
+from .sweeper import release_expired_bookings
+
+
+IMPORT_COLUMNS = ('area_type', 'city', 'primelocation_name', 'address', 'pincode', 'price_per_hr', 'capacity')
+AREA_TYPES = ('Open', 'Covered', 'Both')
+MAX_LOT_CAPACITY = 100000
+
+
+# SQLite generates the spot rows itself from a recursive counter, so no Python
+# object exists per spot. The CTE sits inside the INSERT to allow executemany.
+INSERT_SPOTS_SQL = text(
+    "INSERT INTO parking_spot (lot_id, status) "
+    "WITH RECURSIVE counter(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM counter WHERE n < :spot_count) "
+    "SELECT :lot_id, 'A' FROM counter"
+)
+
+
+def insert_spots(spot_counts):
+    """inserts spot_counts[lot_id] available spots per lot, one executemany in the current transaction"""
+    params = [{'lot_id': lot_id, 'spot_count': count} for lot_id, count in spot_counts.items() if count > 0]
+    if params:
+        db.session.execute(INSERT_SPOTS_SQL, params)
+
+
+def delete_without_live_bookings(lot_id, spot_ids, build_delete):
+    """
+    the delete step shared by lot delete, spot delete and resize, in the current
+    transaction. Expired bookings of spot_ids (a list or select) that the sweeper
+    has not moved yet go to history first, the FK cascade would otherwise drop
+    them. build_delete(has_live_booking) returns the DELETE to run, it must exclude
+    rows for which has_live_booking(criterion on UserBookings.spot_id) is true, so
+    a booking made meanwhile is never cascaded away. Counters and change versions
+    are updated whenever anything moved or was deleted. Returns the rows deleted.
+    """
+    now = datetime.now()
+    moved_to_history = release_expired_bookings(now, UserBookings.spot_id.in_(spot_ids))
+
+    def has_live_booking(spot_criterion):
+        return select(UserBookings.id).where(spot_criterion, UserBookings.leaving_time > now).exists()
+
+    deleted = db.session.execute(
+        build_delete(has_live_booking).execution_options(synchronize_session=False)
+    ).rowcount
+    if moved_to_history or deleted:
+        refresh_lot_counters([lot_id])
+        bump_versions('spots', 'bookings', 'notifications')
+    return deleted
+
+
+def resize_lot(lot_id, target_spots):
+    """
+    grows or shrinks a lot to target_spots spots in one transaction. Growing bulk
+    inserts the missing spots; shrinking deletes, in one statement, the highest
+    numbered free spots with no current or future booking. Returns a report dict
+    with the spot count before/after, the spots added/removed and how many could
+    not be removed because they are still booked.
+    """
+    if target_spots < 0 or target_spots > MAX_LOT_CAPACITY:
+        raise ValueError(f"number of spots must be between 0 and {MAX_LOT_CAPACITY}")
+
+    try:
+        current = db.session.scalar(select(func.count(ParkingSpot.spot_id)).where(ParkingSpot.lot_id == lot_id))
+        report = {'before': current, 'added': 0, 'removed': 0, 'kept_booked': 0}
+        if target_spots > current:
+            insert_spots({lot_id: target_spots - current})
+            report['added'] = target_spots - current
+            refresh_lot_counters([lot_id])
+            bump_versions('spots')
+        elif target_spots < current:
+            to_remove = current - target_spots
+
+            def delete_removable(has_live_booking):
+                # chosen and deleted by the same statement, so a booking made meanwhile can't slip in
+                removable = (
+                    select(ParkingSpot.spot_id)
+                    .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A',
+                           ~has_live_booking(UserBookings.spot_id == ParkingSpot.spot_id))
+                    .order_by(ParkingSpot.spot_id.desc())
+                    .limit(to_remove)
+                )
+                return delete(ParkingSpot).where(ParkingSpot.spot_id.in_(removable))
+
+            removed = delete_without_live_bookings(
+                lot_id, select(ParkingSpot.spot_id).where(ParkingSpot.lot_id == lot_id), delete_removable)
+            report['removed'] = removed
+            report['kept_booked'] = to_remove - removed
+        report['after'] = current + report['added'] - report['removed']
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return report
+
+
+def validate_lot_row(row):
+    """(values for the parkinglot insert, capacity) of a CSV row, or raises ValueError"""
+    values = {}
+    for column, max_length in (('area_type', 20), ('city', 50), ('primelocation_name', 100), ('address', 200), ('pincode', 6)):
+        value = (row.get(column) or '').strip()
+        if not value:
+            raise ValueError(f"{column} is required")
+        if len(value) > max_length:
+            raise ValueError(f"{column} is longer than {max_length} characters")
+        values[column] = value
+
+    if values['area_type'] not in AREA_TYPES:
+        raise ValueError(f"area_type must be one of {', '.join(AREA_TYPES)}")
+    if not values['pincode'].isdigit():
+        raise ValueError("pincode must be numeric")
+    try:
+        values['price_per_hr'] = float(row.get('price_per_hr'))
+        capacity = int(row.get('capacity'))
+    except (TypeError, ValueError):
+        raise ValueError("price_per_hr and capacity must be valid numbers")
+    if values['price_per_hr'] < 0:
+        raise ValueError("price_per_hr cannot be negative")
+    if not 0 <= capacity <= MAX_LOT_CAPACITY:
+        raise ValueError(f"capacity must be between 0 and {MAX_LOT_CAPACITY}")
+    values['total_spots'] = capacity
+    return values, capacity
+
+
+def _import_chunk(chunk, seen_addresses, report):
+    """validates and inserts one chunk [(line_no, row)] in one transaction"""
+    valid = []
+    for line_no, row in chunk:
+        try:
+            values, capacity = validate_lot_row(row)
+        except ValueError as error:
+            report['errors'].append((line_no, str(error)))
+            continue
+        if values['address'] in seen_addresses:
+            report['errors'].append((line_no, "address appears earlier in the file"))
+            continue
+        seen_addresses.add(values['address'])
+        valid.append((line_no, values, capacity))
+
+    # address is unique, rows clashing with existing lots are reported instead of failing the chunk
+    existing = set(db.session.scalars(
+        select(ParkingLot.address).where(ParkingLot.address.in_([values['address'] for _, values, _ in valid]))
+    ))
+    for line_no, values, _ in valid:
+        if values['address'] in existing:
+            report['errors'].append((line_no, "a lot with this address already exists"))
+    valid = [item for item in valid if item[1]['address'] not in existing]
+    if not valid:
+        return
+
+    try:
+        lot_ids = db.session.scalars(
+            insert(ParkingLot).returning(ParkingLot.lot_id, sort_by_parameter_order=True),
+            [values for _, values, _ in valid]
+        ).all()
+        insert_spots({lot_id: capacity for lot_id, (_, _, capacity) in zip(lot_ids, valid)})
+        bump_versions('lots', 'spots')
+        db.session.commit()
+    except Exception as error:
+        db.session.rollback()
+        for line_no, _, _ in valid:
+            report['errors'].append((line_no, f"not imported, chunk failed: {error.__class__.__name__}"))
+        app.logger.exception("Lot import chunk failed.")
+        return
+
+    report['lots'] += len(valid)
+    report['spots'] += sum(capacity for _, _, capacity in valid)
+
+
+def import_lots_csv(text_stream, chunk_size=500):
+    """
+    imports lots (and their spots) from a CSV text stream with a header row of
+    IMPORT_COLUMNS, chunk_size rows per transaction. Rows are read as they are
+    parsed, so the file is never held in memory. Returns a report dict with the
+    lots/spots imported and the (line number, message) errors.
+    """
+    report = {'lots': 0, 'spots': 0, 'errors': []}
+    reader = csv.DictReader(text_stream)
+    missing = [column for column in IMPORT_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        report['errors'].append((1, f"missing columns: {', '.join(missing)}"))
+        return report
+
+    seen_addresses = set()
+    chunk = []
+    for row in reader:
+        chunk.append((reader.line_num, row))
+        if len(chunk) == chunk_size:
+            _import_chunk(chunk, seen_addresses, report)
+            chunk = []
+    if chunk:
+        _import_chunk(chunk, seen_addresses, report)
+
+    report['errors'].sort()
+    return report
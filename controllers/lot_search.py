@@ -0,0 +1,113 @@
+# lot_search.py
+# free text lot search ("conn", "sector 18") over city, name, address and
+# pincode, ranked by the FTS5 index parkinglot_fts (see models/dbmodel.py).
+# Every word is matched as a prefix. Databases without the index (no FTS5,
+# or an older reporting snapshot) fall back to a LIKE scan of parkinglot.
+# The cached entry points for the user pages live in reference_data.py.
+import re
+from sqlalchemy import select, text, and_, or_
+from models.dbmodel import db, ParkingLot, LOT_SEARCH_TABLE
+
+
+SUGGESTION_LIMIT = 8
+SEARCH_RESULT_LIMIT = 200
+MAX_SEARCH_WORDS = 8
+
+# weights of city, primelocation_name, address, pincode: a name match ranks first
+_RANK = f"bm25({LOT_SEARCH_TABLE}, 2.0, 4.0, 1.0, 1.0)"
+_FTS_SEARCH_SQL = text(
+    f"SELECT rowid FROM {LOT_SEARCH_TABLE} WHERE {LOT_SEARCH_TABLE} MATCH :match "
+    f"ORDER BY {_RANK}, rowid LIMIT :limit"
+)
+# suggestions skip the ranking (bm25 has to read every match), FTS returns rows in
+# rowid order and stops at the LIMIT. Name matches are listed before the rest.
+_FTS_SUGGEST_SQL = text(f"SELECT rowid FROM {LOT_SEARCH_TABLE} WHERE {LOT_SEARCH_TABLE} MATCH :match LIMIT :limit")
+_LIKE_COLUMNS = (ParkingLot.city, ParkingLot.primelocation_name, ParkingLot.address, ParkingLot.pincode)
+
+
+def search_words(query):
+    """lower cased words of the query, punctuation dropped"""
+    return re.findall(r'\w+', (query or '').lower())[:MAX_SEARCH_WORDS]
+
+
+def _match_expression(words, column=None):
+    # every word quoted (so it is never read as FTS syntax) and matched as a prefix
+    expression = ' AND '.join(f'"{word}"*' for word in words)
+    return f'{{{column}}}: ({expression})' if column else expression
+
+
+# database urls known to have the index, it is never dropped once created
+_indexed_urls = set()
+
+
+def has_search_index(session):
+    url = str(session.get_bind().url)
+    if url not in _indexed_urls:
+        found = session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"), {'name': LOT_SEARCH_TABLE}
+        ).first() is not None
+        if not found:
+            return False
+        _indexed_urls.add(url)
+    return True
+
+
+def _like_search_ids(session, words, limit):
+    def contains(word):
+        pattern = '%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        return or_(*(column.ilike(pattern, escape='\\') for column in _LIKE_COLUMNS))
+
+    return list(session.scalars(
+        select(ParkingLot.lot_id).where(and_(*(contains(word) for word in words)))
+        .order_by(ParkingLot.lot_id).limit(limit)
+    ))
+
+
+def search_lot_ids_by_text(query, session=None, limit=SEARCH_RESULT_LIMIT):
+    """ids of the lots matching every word of query (as a prefix), best match first"""
+    session = session or db.session
+    words = search_words(query)
+    if not words:
+        return []
+    if not has_search_index(session):
+        return _like_search_ids(session, words, limit)
+    return list(session.scalars(_FTS_SEARCH_SQL, {'match': _match_expression(words), 'limit': limit}))
+
+
+def load_lots_in_order(lot_ids, session=None):
+    """the lots with these ids in the same order, loaded fresh with their counters"""
+    session = session or db.session
+    if not lot_ids:
+        return []
+    lots = {lot.lot_id: lot for lot in session.query(ParkingLot).filter(ParkingLot.lot_id.in_(lot_ids))}
+    return [lots[lot_id] for lot_id in lot_ids if lot_id in lots]
+
+
+def suggest_lot_ids(query, limit=SUGGESTION_LIMIT):
+    """ids of up to limit lots for autocomplete: lots whose name matches first, then any column"""
+    words = search_words(query)
+    if not words:
+        return []
+    if not has_search_index(db.session):
+        return _like_search_ids(db.session, words, limit)
+    lot_ids = list(db.session.scalars(_FTS_SUGGEST_SQL, {'match': _match_expression(words, 'primelocation_name'), 'limit': limit}))
+    if len(lot_ids) < limit:
+        more = db.session.scalars(_FTS_SUGGEST_SQL, {'match': _match_expression(words), 'limit': limit + len(lot_ids)})
+        lot_ids += [lot_id for lot_id in more if lot_id not in lot_ids][:limit - len(lot_ids)]
+    return lot_ids
+
+
+def load_lot_suggestions(query, limit=SUGGESTION_LIMIT):
+    """autocomplete entries (dicts) of the suggested lots"""
+    lot_ids = suggest_lot_ids(query, limit)
+    if not lot_ids:
+        return []
+    rows = {row.lot_id: row for row in db.session.execute(
+        select(ParkingLot.lot_id, ParkingLot.primelocation_name, ParkingLot.city, ParkingLot.pincode, ParkingLot.address)
+        .where(ParkingLot.lot_id.in_(lot_ids))
+    )}
+    return [
+        {'lot_id': row.lot_id, 'name': row.primelocation_name, 'city': row.city,
+         'pincode': row.pincode, 'address': row.address}
+        for row in (rows.get(lot_id) for lot_id in lot_ids) if row is not None
+    ]
@@ -0,0 +1,81 @@
+# lot_stats.py
+# per-lot spot counters. Pages read the denormalized counters on ParkingLot,
+# get_lot_stats() recomputes them from the source tables (reconciliation)
+from sqlalchemy import func, case
+from models.dbmodel import db, UserBookings, ParkingSpot, ParkingLot
+
+
+def get_lot_stats(lot_ids):
+    """
+    returns {lot_id: {'total_spots', 'occupied_physical_spots', 'booked_spots_count'}}
+    for the given lots, computed from parking_spot/user_bookings in one grouped query.
+    booked_spots_count counts the bookings not yet moved to history (current and
+    future), i.e. what is unavailable for new bookings.
+    """
+    lot_ids = list(lot_ids)
+    stats = {lot_id: {'total_spots': 0, 'occupied_physical_spots': 0, 'booked_spots_count': 0} for lot_id in lot_ids}
+    if not lot_ids:
+        return stats
+
+    # bookings per spot, pre-aggregated so the outer join cannot multiply spot rows
+    bookings_per_spot = db.session.query(
+        UserBookings.spot_id,
+        func.count(UserBookings.id).label('booking_count')
+    ).group_by(UserBookings.spot_id).subquery()
+
+    rows = db.session.query(
+        ParkingSpot.lot_id,
+        func.count(ParkingSpot.spot_id).label('total_spots'),
+        func.sum(case((ParkingSpot.status == 'O', 1), else_=0)).label('occupied_physical_spots'),
+        func.coalesce(func.sum(bookings_per_spot.c.booking_count), 0).label('booked_spots_count')
+    ).outerjoin(
+        bookings_per_spot, bookings_per_spot.c.spot_id == ParkingSpot.spot_id
+    ).filter(
+        ParkingSpot.lot_id.in_(lot_ids)
+    ).group_by(ParkingSpot.lot_id)
+
+    for row in rows:
+        stats[row.lot_id] = {
+            'total_spots': row.total_spots,
+            'occupied_physical_spots': row.occupied_physical_spots,
+            'booked_spots_count': row.booked_spots_count
+        }
+    return stats
+
+
+def attach_lot_stats(lots):
+    """
+    pairs each lot with its counters in the shape the lot tables in the templates use.
+    Reads the counter columns already loaded with the lot, so no extra query.
+    """
+    return [{
+        'lot': lot,
+        'total_spots': lot.total_spots,
+        'occupied_physical_spots': lot.occupied_spots,
+        'booked_spots_count': lot.booked_spots
+    } for lot in lots]
+
+
+def find_counter_drift(lot_ids=None):
+    """
+    lots whose stored counters differ from the source tables:
+    [(lot_id, {'total_spots': (stored, actual), ...}), ...] listing only the drifted counters.
+    """
+    query = db.session.query(ParkingLot.lot_id, ParkingLot.total_spots, ParkingLot.occupied_spots, ParkingLot.booked_spots)
+    if lot_ids is not None:
+        query = query.filter(ParkingLot.lot_id.in_(list(lot_ids)))
+    stored = query.all()
+    actual = get_lot_stats(row.lot_id for row in stored)
+
+    drift = []
+    for row in stored:
+        expected = actual[row.lot_id]
+        pairs = {
+            'total_spots': (row.total_spots, expected['total_spots']),
+            'occupied_spots': (row.occupied_spots, expected['occupied_physical_spots']),
+            'booked_spots': (row.booked_spots, expected['booked_spots_count'])
+        }
+        drifted = {name: pair for name, pair in pairs.items() if pair[0] != pair[1]}
+        if drifted:
+            drift.append((row.lot_id, drifted))
+    return drift
@@ -0,0 +1,43 @@
+# notifications.py
+# flashing of the persistent user notifications written by the sweeper.
+# User.unread_notifications says whether there is anything to flash: the writers
+# add what they insert (sweeper.py) and marking read resets it, so a page without
+# unread notifications costs one primary key lookup.
+from flask import flash
+from sqlalchemy import select, update
+from models.dbmodel import db, User, UserNotification
+
+
+def unread_notifications_select(user_id):
+    """the unread notifications of the user, oldest first (ix_user_notifications_unread)"""
+    return (
+        select(UserNotification.id, UserNotification.message_text, UserNotification.message_category)
+        .where(UserNotification.user_id == user_id, UserNotification.is_read == False)
+        .order_by(UserNotification.created_at.asc(), UserNotification.id.asc())
+    )
+
+
+def flash_unread_user_notifications(user_id):
+    """
+    Flashes any unread notifications for the given user_id and marks them as read.
+    """
+    unread_count = db.session.scalar(select(User.unread_notifications).where(User.user_id == user_id))
+    if unread_count:
+        unread_notifications = db.session.execute(unread_notifications_select(user_id)).all()
+
+        for notification in unread_notifications:
+            flash(notification.message_text, notification.message_category)
+
+        # mark them read in one statement, nothing is left unread in this transaction
+        if unread_notifications:
+            db.session.execute(
+                update(UserNotification)
+                .where(UserNotification.id.in_([notification.id for notification in unread_notifications]))
+                .values(is_read=True)
+                .execution_options(synchronize_session=False)
+            )
+        db.session.execute(
+            update(User).where(User.user_id == user_id).values(unread_notifications=0)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
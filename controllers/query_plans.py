@@ -0,0 +1,79 @@
+# query_plans.py
+# the statements of the hot paths, built by the same functions the app runs,
+# with the indexes their EXPLAIN QUERY PLAN must show. Checked against the live
+# database by `flask explain-indexes` and against a scratch one by
+# tests/test_query_plans.py, so every declared index is shown in use.
+from datetime import date, timedelta
+from sqlalchemy import select
+from models.dbmodel import db, UserBookings, UserHistory
+from .availability import free_spot_ids_select
+from .history import history_page_select, current_bookings_select
+from .sweeper import affected_lots_select, activation_notifications_select, expired_history_select
+from .notifications import unread_notifications_select
+from .reference_data import lot_ids_select
+from .user_purge import purge_batch_select
+
+
+# (label, build(now) -> statement, index names the plan must use)
+HOT_STATEMENTS = [
+    ("free spots of a lot (NOT EXISTS)",
+     lambda now: free_spot_ids_select(1, now, now + timedelta(hours=2)).limit(1),
+     ('ix_parking_spot_lot_status', 'ix_user_bookings_spot_window')),
+    ("history page",
+     lambda now: history_page_select(1, before_id=1000),
+     ('ix_booking_history_user_id',)),
+    ("history page by date",
+     lambda now: history_page_select(1, date_from=date(2025, 1, 1), date_to=date(2025, 12, 31)),
+     ('ix_booking_history_user_id',)),
+    ("current bookings of user",
+     lambda now: current_bookings_select(1),
+     ('ix_user_bookings_user_id',)),
+    ("unread notifications of user",
+     lambda now: unread_notifications_select(1),
+     ('ix_user_notifications_unread',)),
+    ("lots by city and pincode",
+     lambda now: lot_ids_select('Delhi', '110001'),
+     ('ix_parkinglot_city_pincode',)),
+    ("lots by pincode",
+     lambda now: lot_ids_select(pincode='110001'),
+     ('ix_parkinglot_pincode',)),
+    ("sweeper lots expiring or activating",
+     lambda now: affected_lots_select(now),
+     ('ix_user_bookings_leaving_time',)),
+    ("sweeper activation notifications",
+     lambda now: activation_notifications_select(now),
+     ('ix_user_bookings_leaving_time',)),
+    ("sweeper expired bookings to history",
+     lambda now: expired_history_select(UserBookings.leaving_time <= now),
+     ('ix_user_bookings_leaving_time',)),
+    ("inactive users to purge",
+     lambda now: purge_batch_select(now - timedelta(days=365), 500),
+     ('ix_user_last_active_at',)),
+    # the lookup SQLite runs for ON DELETE SET NULL of each deleted spot (not shown
+    # by EXPLAIN QUERY PLAN of the DELETE itself)
+    ("history rows of a deleted spot",
+     lambda now: select(UserHistory.id).where(UserHistory.spot_id == 1),
+     ('ix_booking_history_spot_id',)),
+]
+
+
+def explain_query_plan(stmt, conn):
+    """the detail column of each EXPLAIN QUERY PLAN row of stmt"""
+    sql = stmt.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def check_hot_query_plans(now):
+    """
+    (label, plan, problems) of every hot statement. A problem is a missing index
+    or a SCAN step: a hot statement only SEARCHes.
+    """
+    results = []
+    with db.engine.connect() as conn:
+        for label, build, index_names in HOT_STATEMENTS:
+            plan = explain_query_plan(build(now), conn)
+            problems = [f"does not use {index_name}" for index_name in index_names
+                        if not any(index_name in step for step in plan)]
+            problems += [f"scans: {step}" for step in plan if step.startswith('SCAN')]
+            results.append((label, plan, problems))
+    return results
@@ -0,0 +1,104 @@
+# reference_data.py
+# cached reads of parking lot reference data (city list, lots by id, lot search
+# results and suggestions) that change only through the admin lot/spot routes
+from sqlalchemy import select
+from app import app
+from models.dbmodel import db, ParkingLot
+from .cache import get_cache
+from .change_versions import on_change
+from .lot_search import search_words, search_lot_ids_by_text, load_lots_in_order, load_lot_suggestions
+
+
+# counters change with every booking, they are never cached and load fresh on access
+LOT_COUNTER_COLUMNS = ['total_spots', 'occupied_spots', 'booked_spots']
+
+
+def _reference_cache():
+    return get_cache('reference',
+                     maxsize=app.config['REFERENCE_CACHE_MAX_ENTRIES'],
+                     ttl=app.config['REFERENCE_CACHE_TTL_SECONDS'])
+
+
+def get_cities():
+    """distinct cities that have parking lots"""
+    return _reference_cache().get_or_load(('cities',), lambda: [
+        row[0] for row in db.session.query(ParkingLot.city).distinct().all()
+    ])
+
+
+def get_lot(lot_id):
+    """
+    the lot with this id, or None. The cached copy is detached and is merged into
+    the current session without a query (merge(load=False)).
+    """
+    def load_detached_lot():
+        lot = db.session.get(ParkingLot, lot_id)
+        if lot is None:
+            return None
+        db.session.expire(lot, LOT_COUNTER_COLUMNS)
+        db.session.expunge(lot)
+        return lot
+
+    cached_lot = _reference_cache().get_or_load(('lot', lot_id), load_detached_lot)
+    if cached_lot is None:
+        return None
+    return db.session.merge(cached_lot, load=False)
+
+
+def lot_ids_select(city=None, pincode=None):
+    """select of the ids of the lots with the exact city and/or pincode, in lot_id order"""
+    stmt = select(ParkingLot.lot_id)
+    if city:
+        stmt = stmt.where(ParkingLot.city == city)
+    if pincode:
+        stmt = stmt.where(ParkingLot.pincode == pincode)
+    return stmt.order_by(ParkingLot.lot_id)
+
+
+def search_lot_ids(city=None, pincode=None):
+    """ids of the lots matching the exact city and/or pincode, in lot_id order"""
+    return _reference_cache().get_or_load(('lot_search', city or None, pincode or None),
+                                          lambda: list(db.session.scalars(lot_ids_select(city, pincode))))
+
+
+def search_lots(city=None, pincode=None):
+    """lots matching the search, loaded fresh (with their counters) by primary key"""
+    lot_ids = search_lot_ids(city, pincode)
+    if not lot_ids:
+        return []
+    return ParkingLot.query.filter(ParkingLot.lot_id.in_(lot_ids)).order_by(ParkingLot.lot_id).all()
+
+
+def search_lots_by_text(query):
+    """lots matching the free text query (see lot_search.py), best match first"""
+    words = search_words(query)
+    if not words:
+        return []
+    normalized = ' '.join(words)
+    lot_ids = _reference_cache().get_or_load(('lot_search', 'text', normalized),
+                                             lambda: search_lot_ids_by_text(normalized))
+    return load_lots_in_order(lot_ids)
+
+
+def get_lot_suggestions(query):
+    """autocomplete entries for the search box, repeated prefixes are answered from the cache"""
+    words = search_words(query)
+    if not words:
+        return []
+    normalized = ' '.join(words)
+    return _reference_cache().get_or_load(('lot_suggest', normalized), lambda: load_lot_suggestions(normalized))
+
+
+def invalidate_lot_reference_data(lot_id=None):
+    """
+    called after a lot or its spots change: drops the lot itself plus the
+    city list and search results, which any lot write can change.
+    """
+    cache = _reference_cache()
+    if lot_id is not None:
+        cache.invalidate(('lot', lot_id))
+    cache.invalidate_where(lambda key: key[0] in ('cities', 'lot_search', 'lot_suggest'))
+
+
+# lots edited in another worker: the whole cache may be stale
+on_change('lots', lambda: _reference_cache().clear())
@@ -0,0 +1,83 @@
+# reporting.py
+# read-only reporting snapshot: the sweeper leader (or `flask refresh-reporting-snapshot`)
+# copies the live database into REPORTING_SNAPSHOT_PATH with SQLite's online backup API,
+# a few pages at a time so booking commits are not held up. Admin read-only
+# views query it through the 'reporting' bind, so long reports never hold a read lock on
+# the live file. Without the snapshot (disabled, or not taken yet) they read the live db.
+import os
+import sqlite3
+import time
+from datetime import datetime
+from flask import g
+from sqlalchemy.orm import Session
+from app import app
+from models.dbmodel import db
+
+
+_last_refresh_at = None # time.monotonic() of the last refresh in this process
+
+BACKUP_PAGES_PER_STEP = 256
+
+
+def reporting_enabled():
+    return app.config['REPORTING_SNAPSHOT_ENABLED']
+
+
+def get_snapshot_taken_at():
+    """when the current snapshot was written, None if there is none"""
+    path = app.config['REPORTING_SNAPSHOT_PATH']
+    if not reporting_enabled() or not os.path.exists(path):
+        return None
+    return datetime.fromtimestamp(os.path.getmtime(path))
+
+
+def refresh_reporting_snapshot():
+    """
+    copies the live db into a temporary file and swaps it in atomically, readers that
+    still have the old file open finish on it. Returns the seconds the copy took.
+    """
+    global _last_refresh_at
+    _last_refresh_at = time.monotonic()
+    started = time.monotonic()
+    path = app.config['REPORTING_SNAPSHOT_PATH']
+    tmp_path = path + '.tmp'
+
+    source = db.engine.raw_connection()
+    try:
+        target = sqlite3.connect(tmp_path)
+        try:
+            # stepwise copy, between steps writers can commit (the backup restarts if they do)
+            source.driver_connection.backup(target, pages=BACKUP_PAGES_PER_STEP, sleep=0.005)
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+    os.replace(tmp_path, path)
+    return time.monotonic() - started
+
+
+def reporting_snapshot_due():
+    if not reporting_enabled():
+        return False
+    return _last_refresh_at is None or \
+        time.monotonic() - _last_refresh_at >= app.config['REPORTING_SNAPSHOT_INTERVAL_SECONDS']
+
+
+def get_reporting_session():
+    """
+    session for admin read-only views: on the snapshot when there is one, else db.session.
+    One per request, closed on teardown.
+    """
+    if get_snapshot_taken_at() is None:
+        return db.session
+    if 'reporting_session' not in g:
+        g.reporting_session = Session(bind=db.engines['reporting'])
+    return g.reporting_session
+
+
+@app.teardown_appcontext
+def close_reporting_session(exception=None):
+    reporting_session = g.pop('reporting_session', None)
+    if reporting_session is not None:
+        reporting_session.close()
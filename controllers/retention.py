@@ -0,0 +1,112 @@
+# retention.py
+# keeps user_notifications bounded: read notifications older than
+# NOTIFICATION_RETENTION_DAYS are deleted and repeated identical unread
+# messages of a user are merged into the newest one. Both work in batches of
+# NOTIFICATION_RETENTION_BATCH_SIZE rows, one short transaction each, so the
+# job never holds the write lock for long. Run by the sweeper leader every
+# NOTIFICATION_RETENTION_INTERVAL_SECONDS and by `flask purge-notifications`.
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, func, text
+from app import app
+from models.dbmodel import db, UserNotification, refresh_unread_counters
+
+
+_last_retention_at = None # time.monotonic() of the last run in this process
+
+# approximate stored size of a notification row, the text columns plus fixed width ones
+_row_bytes = func.length(UserNotification.message_text) + func.length(UserNotification.message_category) + 24
+
+
+def _delete_batches(id_query, batch_size, on_batch=None):
+    """
+    deletes the rows selected by id_query (a select of (id, user_id, row bytes))
+    batch by batch. Returns (rows, bytes) deleted.
+    """
+    rows_deleted = bytes_deleted = 0
+    while True:
+        batch = db.session.execute(id_query.order_by(UserNotification.id).limit(batch_size)).all()
+        if not batch:
+            break
+        db.session.execute(
+            delete(UserNotification)
+            .where(UserNotification.id.in_([row.id for row in batch]))
+            .execution_options(synchronize_session=False)
+        )
+        if on_batch:
+            on_batch(batch)
+        db.session.commit()
+        rows_deleted += len(batch)
+        bytes_deleted += sum(row.row_bytes or 0 for row in batch)
+        if len(batch) < batch_size:
+            break
+    return rows_deleted, bytes_deleted
+
+
+def purge_read_notifications(older_than_days=None, batch_size=None):
+    """deletes read notifications created more than older_than_days ago, returns (rows, bytes)"""
+    older_than_days = app.config['NOTIFICATION_RETENTION_DAYS'] if older_than_days is None else older_than_days
+    batch_size = batch_size or app.config['NOTIFICATION_RETENTION_BATCH_SIZE']
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+
+    return _delete_batches(
+        select(UserNotification.id, UserNotification.user_id, _row_bytes.label('row_bytes')).where(
+            UserNotification.is_read == True,
+            UserNotification.created_at < cutoff
+        ),
+        batch_size
+    )
+
+
+def merge_duplicate_unread_notifications(batch_size=None):
+    """
+    keeps only the newest of identical unread messages (same user, category and text),
+    and fixes the unread counters of the users concerned. Returns (rows, bytes).
+    """
+    batch_size = batch_size or app.config['NOTIFICATION_RETENTION_BATCH_SIZE']
+    newest_of_each = select(func.max(UserNotification.id)).where(UserNotification.is_read == False).group_by(
+        UserNotification.user_id, UserNotification.message_category, UserNotification.message_text
+    )
+
+    def refresh_counters(batch):
+        refresh_unread_counters(list({row.user_id for row in batch}))
+
+    return _delete_batches(
+        select(UserNotification.id, UserNotification.user_id, _row_bytes.label('row_bytes')).where(
+            UserNotification.is_read == False,
+            UserNotification.id.not_in(newest_of_each)
+        ),
+        batch_size,
+        on_batch=refresh_counters
+    )
+
+
+def get_free_bytes():
+    """bytes of free pages in the database file, reusable by new rows (VACUUM returns them to the OS)"""
+    page_size = db.session.execute(text('PRAGMA page_size')).scalar()
+    freelist_count = db.session.execute(text('PRAGMA freelist_count')).scalar()
+    return page_size * freelist_count
+
+
+def run_notification_retention(older_than_days=None, batch_size=None):
+    """runs both steps, returns a report dict"""
+    global _last_retention_at
+    _last_retention_at = time.monotonic()
+
+    purged_rows, purged_bytes = purge_read_notifications(older_than_days, batch_size)
+    merged_rows, merged_bytes = merge_duplicate_unread_notifications(batch_size)
+    return {
+        'purged_read_rows': purged_rows,
+        'merged_unread_rows': merged_rows,
+        'rows_reclaimed': purged_rows + merged_rows,
+        'bytes_reclaimed': purged_bytes + merged_bytes,
+        'free_bytes': get_free_bytes()
+    }
+
+
+def notification_retention_due():
+    """true when this process has not run the retention job for NOTIFICATION_RETENTION_INTERVAL_SECONDS"""
+    interval = app.config['NOTIFICATION_RETENTION_INTERVAL_SECONDS']
+    if interval <= 0:
+        return False
+    return _last_retention_at is None or time.monotonic() - _last_retention_at >= interval
@@ -0,0 +1,147 @@
+# rollups.py
+# keeps lot_daily_rollup (bookings and revenue per lot per day) and
+# user_lot_rollup (per user per lot) up to date as bookings move to history,
+# so the summary pages read a few pre-aggregated rows instead of grouping
+# all of booking_history.
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models.dbmodel import db, User, UserBookings, UserHistory, ParkingLot, ParkingSpot, LotDailyRollup, UserLotRollup
+from .archive import get_archived_months, archive_path, archive_key
+
+
+def _upsert_from_select(model, key_columns, rows_select):
+    """adds the (keys..., booking_count, revenue) rows of rows_select onto the rollup table"""
+    stmt = sqlite_insert(model).from_select([*key_columns, 'booking_count', 'revenue'], rows_select)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={
+            'booking_count': model.booking_count + stmt.excluded.booking_count,
+            'revenue': model.revenue + stmt.excluded.revenue
+        }
+    )
+    db.session.execute(stmt)
+
+
+def _upsert_values(model, key_columns, rows):
+    """same as _upsert_from_select for a list of dicts"""
+    if not rows:
+        return
+    stmt = sqlite_insert(model).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={
+            'booking_count': model.booking_count + stmt.excluded.booking_count,
+            'revenue': model.revenue + stmt.excluded.revenue
+        }
+    )
+    db.session.execute(stmt)
+
+
+def rollup_bookings(*criteria):
+    """
+    adds the bookings matching criteria (UserBookings where clauses) to both rollups,
+    in the current transaction. Call it when they move to history, before deleting them.
+    """
+    day = func.date(UserBookings.parking_time)
+    _upsert_from_select(LotDailyRollup, ['lot_id', 'day'],
+        select(ParkingSpot.lot_id, day, func.count(UserBookings.id), func.sum(UserBookings.parking_cost))
+        .join(ParkingSpot, ParkingSpot.spot_id == UserBookings.spot_id)
+        .where(*criteria)
+        .group_by(ParkingSpot.lot_id, day)
+    )
+    _upsert_from_select(UserLotRollup, ['user_id', 'lot_id'],
+        select(UserBookings.user_id, ParkingSpot.lot_id, func.count(UserBookings.id), func.sum(UserBookings.parking_cost))
+        .join(ParkingSpot, ParkingSpot.spot_id == UserBookings.spot_id)
+        .where(*criteria)
+        .group_by(UserBookings.user_id, ParkingSpot.lot_id)
+    )
+
+
+def delete_user_rollups(user_ids):
+    """drops the per-lot rollups of deleted users, lot totals keep their bookings"""
+    db.session.execute(
+        delete(UserLotRollup).where(UserLotRollup.user_id.in_(user_ids)).execution_options(synchronize_session=False)
+    )
+
+
+def delete_lot_rollups(lot_id):
+    """drops both rollups of a lot being deleted, in the current transaction"""
+    for model in (LotDailyRollup, UserLotRollup):
+        db.session.execute(delete(model).where(model.lot_id == lot_id).execution_options(synchronize_session=False))
+
+
+def rebuild_rollups():
+    """
+    recomputes both rollups from booking_history plus the history archive files,
+    in one transaction. Archived bookings of deleted lots are left out, those of
+    deleted users only count towards the lot totals. Returns (lot_day_rows, user_lot_rows).
+    """
+    db.session.execute(delete(LotDailyRollup))
+    db.session.execute(delete(UserLotRollup))
+
+    day = func.date(UserHistory.booking_time)
+    _upsert_from_select(LotDailyRollup, ['lot_id', 'day'],
+        select(ParkingSpot.lot_id, day, func.count(UserHistory.id), func.sum(UserHistory.parking_cost))
+        .join(ParkingSpot, ParkingSpot.spot_id == UserHistory.spot_id)
+        .group_by(ParkingSpot.lot_id, day)
+    )
+    _upsert_from_select(UserLotRollup, ['user_id', 'lot_id'],
+        select(UserHistory.user_id, ParkingSpot.lot_id, func.count(UserHistory.id), func.sum(UserHistory.parking_cost))
+        .join(ParkingSpot, ParkingSpot.spot_id == UserHistory.spot_id)
+        .group_by(UserHistory.user_id, ParkingSpot.lot_id)
+    )
+
+    user_ids = set(db.session.scalars(select(User.user_id))) # archive records of deleted users only count for their lot
+    lot_ids = set(db.session.scalars(select(ParkingLot.lot_id)))
+    for month in get_archived_months():
+        path = archive_path(month)
+        if not os.path.exists(path):
+            continue
+        records = {}
+        with gzip.open(path, 'rt', encoding='utf-8') as archive_file:
+            for line in archive_file:
+                record = json.loads(line)
+                if record['lot_id'] in lot_ids:
+                    records[archive_key(record)] = record
+        # rows archived but not yet deleted (interrupted run) are already counted above
+        live_keys = set()
+        record_ids = list({record['id'] for record in records.values()})
+        for start in range(0, len(record_ids), 500):
+            live_keys.update(
+                (row.id, row.user_id, row.booking_time.isoformat()) for row in db.session.execute(
+                    select(UserHistory.id, UserHistory.user_id, UserHistory.booking_time)
+                    .where(UserHistory.id.in_(record_ids[start:start + 500]))
+                )
+            )
+
+        lot_days = defaultdict(lambda: [0, Decimal(0)])
+        user_lots = defaultdict(lambda: [0, Decimal(0)])
+        for key, record in records.items():
+            if key in live_keys:
+                continue
+            cost = Decimal(record['parking_cost'])
+            booking_day = datetime.fromisoformat(record['booking_time']).date()
+            rollup_totals = [lot_days[(record['lot_id'], booking_day)]]
+            if record['user_id'] in user_ids:
+                rollup_totals.append(user_lots[(record['user_id'], record['lot_id'])])
+            for totals in rollup_totals:
+                totals[0] += 1
+                totals[1] += cost
+
+        _upsert_values(LotDailyRollup, ['lot_id', 'day'], [
+            {'lot_id': lot_id, 'day': booking_day, 'booking_count': count, 'revenue': revenue}
+            for (lot_id, booking_day), (count, revenue) in lot_days.items()
+        ])
+        _upsert_values(UserLotRollup, ['user_id', 'lot_id'], [
+            {'user_id': user_id, 'lot_id': lot_id, 'booking_count': count, 'revenue': revenue}
+            for (user_id, lot_id), (count, revenue) in user_lots.items()
+        ])
+
+    db.session.commit()
+    return LotDailyRollup.query.count(), UserLotRollup.query.count()
@@ -1,21 +1,52 @@
 # routes.py
-from flask import Flask, render_template, request, redirect, url_for, flash, session, get_flashed_messages
+from flask import Flask, render_template, request, redirect, url_for, flash, session, get_flashed_messages, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from models.dbmodel import * 
 from app import app 
 from werkzeug.security import generate_password_hash, check_password_hash
 from slugify import slugify
 from datetime import datetime, timedelta
-from sqlalchemy import func, or_ # import or_ for complex filters
+from sqlalchemy import func, or_, select, delete # import or_ for complex filters
 import json
+import csv
+import io
 from functools import wraps 
 
 # import your decorators from the separate file
 from .decorators import login_required, admin_required, only_user, user_access_required
+from .sweeper import start_background_sweeper, note_booking_change, get_sweep_stats, release_expired_bookings
+from .availability import find_conflicting_bookings
+from .lot_stats import attach_lot_stats
+from .spot_details import load_spot_details, load_spot_grid, encode_spot_grid
+from .slot_index import find_free_spot_ids, allocate_spot_id, note_booking_confirmed, note_booking_released, invalidate_lot_index
+from .reference_data import get_cities, get_lot, search_lots, search_lots_by_text, get_lot_suggestions, invalidate_lot_reference_data
+from .lot_search import search_lot_ids_by_text, load_lots_in_order
+from .cache import all_cache_stats
+from .change_versions import check_change_versions
+from .user_cache import invalidate_user
+from .user_purge import note_user_activity, delete_users, inactive_cutoff, count_inactive_users, purge_inactive_users_batch
+from .notifications import flash_unread_user_notifications
+from .history import get_history_page, get_recent_history, current_bookings_select
+from .archive import get_archived_months, get_archived_history_page, get_archived_row_count
+from .rollups import rollup_bookings, delete_lot_rollups
+from .reporting import get_reporting_session, get_snapshot_taken_at
+from .exports import EXPORT_DATASETS, EXPORT_FORMATS, iter_export, export_filename
+from .lot_bulk import insert_spots, import_lots_csv, resize_lot, delete_without_live_bookings, IMPORT_COLUMNS
 
 
 app.permanent_session_lifetime = timedelta(minutes=10) # set session lifetime to 10 minutes
 
+
+# booking activation/expiry runs in the background sweeper, started on the first request of each worker
+@app.before_request
+def ensure_background_sweeper():
+    start_background_sweeper()
+
+# drop per-process caches made stale by writes in other workers, see controllers/change_versions.py
+@app.before_request
+def drop_stale_caches():
+    check_change_versions()
+
 # ---------------------------------------------PUBLIC ROUTES------------------------------------------------
 
 # -------------------------
@@ -77,6 +108,7 @@ def login():
     session['username'] = user.user_name
     session['is_admin'] = user.is_admin
     session.permanent = True
+    note_user_activity(user.user_id)
 
     flash("Login Successful", "success")
 
@@ -115,6 +147,7 @@ def register():
     passhash = generate_password_hash(password)
     new_user = User(email_id=email, pass_wd=passhash, user_name=username, is_admin=False)
     db.session.add(new_user)
+    bump_versions('users')
     db.session.commit()
 
     flash("User registered successfully, Please Login to continue", "success")
@@ -130,109 +163,6 @@ def logout():
     return redirect(url_for('home'))
 
 
-
-# -----------------------------
-# HELPER FUNCTION:
-# To update spot statuses and store messages persistently
-# This function only stores notifications in the db. It does not flash them directly.
-# -----------------------------
-
-def update_spot_statuses_and_counts():
-    """
-    updates parking spot statuses and stores flash messages persistently
-    in the database for relevant users.
-    This function does not return messages for immediate flashing.
-    """
-    now = datetime.now()
-    
-    # Helper to add a message to the database
-    def add_user_notification_to_db(user_id, category, message_text):
-        new_notification = UserNotification(
-            user_id=user_id,
-            message_category=category,
-            message_text=message_text
-        )
-        db.session.add(new_notification)
-
-    # --- activating bookings ---
-    bookings_to_activate = UserBookings.query.filter(
-        UserBookings.parking_time <= now,
-        UserBookings.leaving_time > now,
-        ParkingSpot.spot_id == UserBookings.spot_id,
-        ParkingSpot.status == 'A'
-    ).join(ParkingSpot).all()
-
-    for booking in bookings_to_activate:
-        if booking.spot: 
-            booking.spot.status = 'O'
-            add_user_notification_to_db(
-                booking.user_id,
-                "info",
-                f"Booked spot {booking.spot_id} is now active. Please proceed to your spot."
-            )
-    
-    # --- release booking on expiry ---
-    bookings_to_expire = UserBookings.query.filter(
-        UserBookings.leaving_time <= now 
-    ).all()
-
-    # collect user ids for which "expired" messages need to be generated *before* deleting bookings.
-    expired_user_ids = set()
-    for booking in bookings_to_expire:
-        expired_user_ids.add(booking.user_id)
-
-        # move expired booking to UserHistory
-        history = UserHistory(
-            user_id=booking.user_id,
-            spot_id=booking.spot_id,
-            booking_time=booking.parking_time,
-            leaving_time=booking.leaving_time,
-            parking_cost=booking.parking_cost,
-            vehicle_no=booking.vehicle_no
-        )
-        db.session.add(history)
-        
-        # freeing spot if was occupied
-        if booking.spot and booking.spot.status == 'O':
-            booking.spot.status = 'A'
-        
-        db.session.delete(booking)
-    
-    # adding a single "expired" message for each user who had bookings expire
-    for user_id in expired_user_ids:
-        add_user_notification_to_db(
-            user_id,
-            "warning",
-            "Some of your past bookings have expired and are moved to history. Please evacuate the parking spot if you haven't already."
-        )
-
-    # commit all changes in one go
-    if bookings_to_activate or bookings_to_expire:
-        db.session.commit()
-    
-
-
-# -----------------------------
-# HELPER FUNCTION:
-# To flash unread messages from the database for the current user
-# -----------------------------
-def flash_unread_user_notifications(user_id):
-    """
-    Flashes any unread notifications for the given user_id and marks them as read.
-    """
-    unread_notifications = UserNotification.query.filter_by(
-        user_id=user_id,
-        is_read=False
-    ).order_by(UserNotification.created_at.asc()).all()
-
-    for notification in unread_notifications:
-        flash(notification.message_text, notification.message_category)
-        notification.is_read = True # mark as read
-
-    if unread_notifications: # oOnly commit if there were notifications to mark as read
-        db.session.commit()
-
-
 # ---------------------------------------------USER ROUTES------------------------------------------------
 
 # -------------------------
@@ -243,19 +173,16 @@ def flash_unread_user_notifications(user_id):
 @user_access_required 
 @only_user
 def user_home(user_id, slug, user): 
-    cities = [row[0] for row in db.session.query(ParkingLot.city).distinct().all()]
+    cities = get_cities()
 
-    # call helper function to update statuses and store messages in DB
-    update_spot_statuses_and_counts() 
-    
     # flash any unread messages for this user from the database
     flash_unread_user_notifications(user.user_id)
     
     # fetch active bookings (after updates)
-    active_bookings = UserBookings.query.filter_by(user_id=user.user_id).all()
+    active_bookings = db.session.scalars(current_bookings_select(user.user_id)).all()
 
     # recent history
-    recent_history = UserHistory.query.filter_by(user_id=user.user_id).order_by(UserHistory.id.desc()).limit(5).all()
+    recent_history = get_recent_history(user.user_id)
 
     return render_template('user_home1.html', user=user, cities=cities,
                            current_bookings=active_bookings, recent_history=recent_history, now=datetime.now())
@@ -266,9 +193,6 @@ def user_home(user_id, slug, user):
 @only_user
 @user_access_required
 def release_booking(user_id, slug, user, booking_id):
-    # calling global update to ensure all statuses are fresh and messages are stored in DB
-    update_spot_statuses_and_counts() 
-
     # attempt to get the booking. It might be none if it was just expired and moved to history
     booking = UserBookings.query.get(booking_id)
 
@@ -301,11 +225,20 @@ def release_booking(user_id, slug, user, booking_id):
     db.session.add(history)
 
     # Free the parking spot
+    released_spot_ids = None
     if booking.spot: # --- check if spot exists ---
+        was_occupied = booking.spot.status == 'O'
         booking.spot.status = 'A' #make spot Physically Available
+        released_spot_ids = (booking.spot.lot_id, booking.spot.spot_id)
+        adjust_lot_counters(booking.spot.lot_id, occupied=-1 if was_occupied else 0, booked=-1)
 
+    rollup_bookings(UserBookings.id == booking.id)
     db.session.delete(booking)
+    bump_versions('bookings')
     db.session.commit()
+    note_booking_change() # the released booking may have been the sweeper's next event
+    if released_spot_ids:
+        note_booking_released(*released_spot_ids)
     
     if is_future_booking:
         flash("Future booking cancelled successfully!", "success")
@@ -327,9 +260,6 @@ def release_booking(user_id, slug, user, booking_id):
 @only_user # Ensure this is a non-admin user's profile
 def profile(user_id, slug, user): # 'user' object is injected
 
-    # calling helper function if users spot freed/occupied right before this action
-    update_spot_statuses_and_counts() 
-    
     flash_unread_user_notifications(user.user_id) 
 
     if request.method == "POST":
@@ -374,31 +304,30 @@ def profile(user_id, slug, user): # 'user' object is injected
                 flash("You have active or future bookings. Please release them before deleting your account.", "warning")
                 return redirect(url_for('profile', user_id=user.user_id, slug=slugify(user.user_name)))
             
-            # free up any spots that were physically occupied by this user (if any)
-            occupied_spots_by_user = ParkingSpot.query.join(UserBookings).filter(
-                UserBookings.user_id == user.user_id,
-                ParkingSpot.status == 'O'
+            # expired bookings the sweeper has not moved yet, so the user has no bookings left
+            affected_lot_ids = db.session.scalars(
+                select(ParkingSpot.lot_id).join(UserBookings).where(UserBookings.user_id == user.user_id).distinct()
             ).all()
+            release_expired_bookings(datetime.now(), UserBookings.user_id == user.user_id)
+            refresh_lot_counters(affected_lot_ids)
 
-            for spot in occupied_spots_by_user:
-                spot.status = 'A'
-
-            # delete user's history & bookings (explicitly, even if cascade delete is set up)
-            UserBookings.query.filter_by(user_id=user.user_id).delete()
-            UserHistory.query.filter_by(user_id=user.user_id).delete()
-            
-            # delete user's notifications
-            UserNotification.query.filter_by(user_id=user.user_id).delete()
-
-            # Delete user
-            db.session.delete(user)
+            # one DELETE, the database cascades to history and notifications
+            deleted_user_id = user.user_id
+            if not delete_users(User.user_id == deleted_user_id):
+                db.session.rollback()
+                flash("You have active or future bookings. Please release them before deleting your account.", "warning")
+                return redirect(url_for('profile', user_id=user.user_id, slug=slugify(user.user_name)))
+            bump_versions('bookings', 'notifications')
             db.session.commit()
+            invalidate_user(deleted_user_id)
 
             session.clear()
             flash("Your account and all data have been deleted.", "success")
             return redirect(url_for('home'))
 
+        bump_versions('users')
         db.session.commit() # commit changes
+        invalidate_user(user_id)
         return redirect(url_for('profile', user_id=user.user_id, slug=slugify(user.user_name)))
 
     return render_template('profile.html', user=user)
@@ -413,14 +342,36 @@ def profile(user_id, slug, user): # 'user' object is injected
 @only_user
 def user_history(user_id, slug, user): 
 
-    update_spot_statuses_and_counts() 
-    
     flash_unread_user_notifications(user.user_id)
 
-    # Fetch full history for this user
-    user_history = UserHistory.query.filter_by(user_id=user.user_id).order_by(UserHistory.id.desc()).all()
+    # one page of history, older pages through the ?before=<id> cursor of the "load more" link
+    before_id = request.args.get('before', type=int)
+    date_from_str = request.args.get('from') or ''
+    date_to_str = request.args.get('to') or ''
+    try:
+        date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date() if date_from_str else None
+        date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date() if date_to_str else None
+    except ValueError:
+        flash("Dates must be in YYYY-MM-DD format.", "warning")
+        date_from = date_to = None
+        date_from_str = date_to_str = ''
+
+    # ?archive=YYYY-MM pages through an archived month instead of the live table
+    archived_months = get_archived_months()
+    archive_month = request.args.get('archive')
+    if archive_month and archive_month not in archived_months:
+        flash("That month is not archived.", "warning")
+        archive_month = None
+
+    if archive_month:
+        user_history, next_cursor = get_archived_history_page(user.user_id, archive_month, before_id, date_from, date_to)
+    else:
+        user_history, next_cursor = get_history_page(user.user_id, before_id, date_from, date_to)
 
-    return render_template('user_history.html', user=user, user_history=user_history)
+    return render_template('user_history.html', user=user, user_history=user_history,
+                           next_cursor=next_cursor, is_first_page=before_id is None,
+                           date_from=date_from_str, date_to=date_to_str,
+                           archived_months=archived_months, archive_month=archive_month)
 
 
 # ------------------------
@@ -431,47 +382,35 @@ def user_history(user_id, slug, user):
 @user_access_required
 @only_user
 def search_parking(user_id, slug, user):
-    cities = [row[0] for row in db.session.query(ParkingLot.city).distinct().all()]
+    cities = get_cities()
 
-    update_spot_statuses_and_counts() 
-    
     flash_unread_user_notifications(user.user_id)
     
     if request.method == 'POST':
+        query = (request.form.get('q') or '').strip()
         city = request.form.get('city')
         pincode = request.form.get('pincode')
 
-        query = ParkingLot.query
-        if city:
-            query = query.filter_by(city=city)
-        if pincode:
-            query = query.filter_by(pincode=pincode)
-
-        parking_lots = query.all()
-        # for each lot, calculate total, physically occupied, and booked spots dynamically
-        lots_with_stats = []
-        for lot in parking_lots:
-            total_spots = ParkingSpot.query.filter_by(lot_id=lot.lot_id).count()
-            # count spots that are physically occupied (status 'O')
-            occupied_physical_spots = ParkingSpot.query.filter_by(lot_id=lot.lot_id, status='O').count()
-            
-            # count spots that are currently booked (future or present)
-            # this is the count of spots that are 'unavailable for new bookings'
-            booked_spots_count = UserBookings.query.join(ParkingSpot).filter(
-                ParkingSpot.lot_id == lot.lot_id,
-                UserBookings.leaving_time > datetime.now() # booking is not yet expired
-            ).count()
+        if query: # free text, ranked (name, area, address or pincode prefixes)
+            parking_lots = search_lots_by_text(query)
+        else:
+            parking_lots = search_lots(city, pincode)
+        # for each lot, calculate total, physically occupied, and booked spots in one grouped query
+        lots_with_stats = attach_lot_stats(parking_lots)
 
-            lots_with_stats.append({
-                'lot': lot,
-                'total_spots': total_spots,
-                'occupied_physical_spots': occupied_physical_spots, # New stat for physical occupancy
-                'booked_spots_count': booked_spots_count # Number of spots currently unavailable for new bookings
-            })
+        return render_template('search_parking.html', user=user, parking_lots_with_stats=lots_with_stats, cities=cities, query=query)
 
-        return render_template('search_parking.html', user=user, parking_lots_with_stats=lots_with_stats, cities=cities)
+    return render_template('search_parking.html', user=user, parking_lots_with_stats=None, cities=cities, query='')
 
-    return render_template('search_parking.html', user=user, parking_lots_with_stats=None, cities=cities)
+
+# ------------------------
+# LOT SEARCH SUGGESTIONS (autocomplete, JSON)
+# ------------------------
+@app.route('/lots/suggest')
+@login_required
+def suggest_parking_lots():
+    query = request.args.get('q', '')[:100]
+    return jsonify({'query': query, 'suggestions': get_lot_suggestions(query)})
 
 
 # ------------------------
@@ -482,7 +421,7 @@ def search_parking(user_id, slug, user):
 @user_access_required
 @only_user
 def book_spot(user_id, slug, lot_id, user):
-    lot = ParkingLot.query.get(lot_id)
+    lot = get_lot(lot_id)
     
     flash_unread_user_notifications(user.user_id) 
 
@@ -541,30 +480,14 @@ def book_spot(user_id, slug, lot_id, user):
         estimated_price = round(hours * lot.price_per_hr, 2)
 
         # --- check for overall availability for the time period ---
-        all_spots_in_lot = ParkingSpot.query.filter_by(lot_id=lot_id).all()
-        
-        available_spot_ids_for_period = [] 
-
-        for spot_candidate in all_spots_in_lot:
-            overlapping_bookings_for_spot = UserBookings.query.filter( 
-                UserBookings.spot_id == spot_candidate.spot_id,
-                UserBookings.parking_time < leaving_time, 
-                UserBookings.leaving_time > parking_time 
-            ).all()
-
-            if not overlapping_bookings_for_spot: 
-                available_spot_ids_for_period.append(spot_candidate.spot_id)
-            else:
-                for conflict in overlapping_bookings_for_spot:
-                    conflicting_bookings_info.append({
-                        'spot_id': spot_candidate.spot_id,
-                        'parking_time': conflict.parking_time.strftime('%Y-%m-%d %H:%M'),
-                        'leaving_time': conflict.leaving_time.strftime('%Y-%m-%d %H:%M')
-                    })
+        # answered from the lots slot bitmap, with a single NOT EXISTS query as fallback
+        available_spot_ids_for_period = find_free_spot_ids(lot_id, parking_time, leaving_time, limit=1)
         
         is_any_spot_available_for_period = bool(available_spot_ids_for_period)
         
         if not is_any_spot_available_for_period: 
+            # conflicts are only shown when the lot is full, so only fetch them then
+            conflicting_bookings_info = find_conflicting_bookings(lot_id, parking_time, leaving_time)
             flash("No spots are available for the selected time period in this parking lot. Please adjust your times.", "danger")
             is_preview_mode = True 
             return render_template('book_spot.html', user=user, lot=lot, estimated_price=estimated_price,
@@ -573,26 +496,15 @@ def book_spot(user_id, slug, lot_id, user):
                                    is_any_spot_available_for_period=is_any_spot_available_for_period) 
 
         if action == 'confirm': 
-            selected_spot_id = available_spot_ids_for_period[0] 
-            spot = ParkingSpot.query.get(selected_spot_id) 
-
-            if not spot: # --- check if spot exists before proceeding ---
-                flash("The selected spot became unavailable just now. Please try again or choose different times.", "danger")
-                return redirect(url_for('book_spot', user_id=user.user_id, slug=slugify(user.user_name), lot_id=lot_id))
+            selected_spot_id = allocate_spot_id(lot_id, parking_time, leaving_time)
 
-            recheck_overlapping = UserBookings.query.filter(
-                UserBookings.spot_id == spot.spot_id,
-                UserBookings.parking_time < leaving_time,
-                UserBookings.leaving_time > parking_time
-            ).first()
-
-            if recheck_overlapping:
+            if not selected_spot_id: # --- another booking took the last spot since the check above ---
                 flash("The selected spot became unavailable just now. Please try again or choose different times.", "danger")
                 return redirect(url_for('book_spot', user_id=user.user_id, slug=slugify(user.user_name), lot_id=lot_id))
 
             booking = UserBookings(
                 user_id=user.user_id,
-                spot_id=spot.spot_id,
+                spot_id=selected_spot_id,
                 parking_time=parking_time,
                 leaving_time=leaving_time,
                 parking_cost=estimated_price,
@@ -600,9 +512,13 @@ def book_spot(user_id, slug, lot_id, user):
             )
 
             db.session.add(booking)
+            adjust_lot_counters(lot_id, booked=1)
+            bump_versions('bookings')
             db.session.commit()
+            note_booking_change(parking_time) # wake the sweeper in time to activate this booking
+            note_booking_confirmed(lot_id, selected_spot_id, parking_time, leaving_time)
 
-            flash(f"Booking confirmed! Spot {spot.spot_id} is booked for you. Total cost: ₹ {estimated_price}", "success")
+            flash(f"Booking confirmed! Spot {selected_spot_id} is booked for you. Total cost: ₹ {estimated_price}", "success")
             return redirect(url_for('user_home', user_id=user.user_id, slug=slugify(user.user_name)))
         
         elif action == 'preview': 
@@ -621,18 +537,15 @@ def book_spot(user_id, slug, lot_id, user):
 @only_user
 def user_summary(user_id, slug, user):
 
-    update_spot_statuses_and_counts() 
-    
     flash_unread_user_notifications(user.user_id)
     
-    # Group bookings by parking lot name from history
+    # Group bookings by parking lot name, from the per user per lot rollup
     data = (
-        db.session.query(ParkingLot.primelocation_name, func.count(UserHistory.id))
-        .join(ParkingSpot, ParkingSpot.lot_id == ParkingLot.lot_id)
-        .join(UserHistory, UserHistory.spot_id == ParkingSpot.spot_id)
-        .filter(UserHistory.user_id == user.user_id)
+        db.session.query(ParkingLot.primelocation_name, func.sum(UserLotRollup.booking_count))
+        .join(UserLotRollup, UserLotRollup.lot_id == ParkingLot.lot_id)
+        .filter(UserLotRollup.user_id == user.user_id)
         .group_by(ParkingLot.primelocation_name)
-        .order_by(func.count(UserHistory.id).desc())
+        .order_by(func.sum(UserLotRollup.booking_count).desc())
         .limit(5)
         .all()
     )
@@ -658,21 +571,9 @@ def user_summary(user_id, slug, user):
 @admin_required
 def admin_dashboard():
 
-    # this will store messages in the db for affected users, but not flash them to admin.
-    update_spot_statuses_and_counts() 
-    
     parking_lots = ParkingLot.query.all()
     
-    lots_with_stats = []
-    for lot in parking_lots:
-        total_spots = ParkingSpot.query.filter_by(lot_id=lot.lot_id).count()
-        occupied_physical_spots = ParkingSpot.query.filter_by(lot_id=lot.lot_id, status='O').count()
-        
-        lots_with_stats.append({
-            'lot': lot,
-            'total_spots': total_spots,
-            'occupied_physical_spots': occupied_physical_spots
-        })
+    lots_with_stats = attach_lot_stats(parking_lots) # one grouped query for all lots
 
     return render_template('admin_dashboard.html', lots_with_stats=lots_with_stats)
 
@@ -716,7 +617,9 @@ def admin_profile():
             else:
                 flash("Old password is incorrect", "danger")
 
+        bump_versions('users')
         db.session.commit()
+        invalidate_user(session['user_id'])
         return redirect(url_for('admin_profile'))
 
     return render_template('admin_profile.html', user=user)
@@ -749,15 +652,17 @@ def add_parking():
             return render_template('add_parking_lot.html')
 
         new_lot = ParkingLot(area_type=area_type, city=city, primelocation_name=prime_loc,
-                             price_per_hr=price_per_hr, address=address, pincode=pincode)
+                             price_per_hr=price_per_hr, address=address, pincode=pincode,
+                             total_spots=capacity)
 
         db.session.add(new_lot)
         db.session.flush() # Get lotid before commit
 
-        for _ in range(capacity): 
-            db.session.add(ParkingSpot(lot_id=new_lot.lot_id, status='A')) 
+        insert_spots({new_lot.lot_id: capacity}) # one bulk insert, not an ORM object per spot
 
+        bump_versions('lots', 'spots')
         db.session.commit()    
+        invalidate_lot_reference_data()
 
         flash(f"Parking Lot added successfully with {capacity} spots!", "success")
         return redirect(url_for('admin_dashboard'))
@@ -765,29 +670,62 @@ def add_parking():
     return render_template('add_parking_lot.html')
 
 
+# -------------------------
+# IMPORT PARKING LOTS FROM CSV-admin
+# -------------------------
+@app.route('/admin/import_parking_lots', methods=['GET', 'POST'])
+@admin_required
+def import_parking_lots():
+    if request.method == 'POST':
+        csv_file = request.files.get('lots_csv')
+        if not csv_file or not csv_file.filename:
+            flash("Please choose a CSV file to import.", "warning")
+            return redirect(url_for('import_parking_lots'))
+
+        # parsed straight from the upload stream, chunk by chunk
+        text_stream = io.TextIOWrapper(csv_file.stream, encoding='utf-8-sig', newline='')
+        try:
+            report = import_lots_csv(text_stream)
+        except (UnicodeDecodeError, csv.Error) as error:
+            flash(f"Could not read the CSV file: {error}", "danger")
+            return redirect(url_for('import_parking_lots'))
+        invalidate_lot_reference_data()
+
+        flash(f"Imported {report['lots']} parking lot(s) with {report['spots']} spot(s).",
+              "success" if not report['errors'] else "warning")
+        return render_template('import_parking_lots.html', report=report, columns=IMPORT_COLUMNS)
+
+    return render_template('import_parking_lots.html', report=None, columns=IMPORT_COLUMNS)
+
+
 # -------------------------
 # DELETE PARKING LOT-admin 
 # -------------------------
 @app.route('/admin/delete_parking_lot/<int:lot_id>')
 @admin_required
 def delete_parking(lot_id):
-    lot = ParkingLot.query.get(lot_id)
+    lot = get_lot(lot_id)
     if not lot:
         flash("Parking Lot not found!", "danger")
         return redirect(url_for('admin_dashboard'))
     
-    # check for any active future or current bookings associated with spots in this lot
-    active_bookings_in_lot = UserBookings.query.join(ParkingSpot).filter(
-        ParkingSpot.lot_id == lot_id,
-        UserBookings.leaving_time > datetime.now() 
-    ).first()
-
-    if active_bookings_in_lot:
+    # one statement: the database cascades to the spots (and history keeps its rows
+    # with spot_id SET NULL). It only matches while no spot has a current or future booking.
+    lot_spot_ids = select(ParkingSpot.spot_id).where(ParkingSpot.lot_id == lot_id)
+    deleted = delete_without_live_bookings(lot_id, lot_spot_ids, lambda has_live_booking: delete(ParkingLot).where(
+        ParkingLot.lot_id == lot_id, ~has_live_booking(UserBookings.spot_id.in_(lot_spot_ids))
+    ))
+
+    if not deleted:
+        db.session.commit() # keeps the expired bookings moved to history
         flash("Cannot delete Parking Lot with active (future or current) bookings! Please ensure all spots are free.", "warning")
         return redirect(url_for('admin_dashboard'))
 
-    db.session.delete(lot)
+    delete_lot_rollups(lot_id)
+    bump_versions('lots')
     db.session.commit()
+    invalidate_lot_index(lot_id)
+    invalidate_lot_reference_data(lot_id)
     flash("Parking Lot deleted successfully!", "success")
     return redirect(url_for('admin_dashboard'))
 
@@ -798,7 +736,7 @@ def delete_parking(lot_id):
 @app.route('/admin/edit_parking_lot/<int:lot_id>', methods=['GET', 'POST'])
 @admin_required
 def edit_parking(lot_id):
-    lot = ParkingLot.query.get(lot_id)
+    lot = get_lot(lot_id)
     if not lot:
         flash("Parking Lot not found!", "danger")
         return redirect(url_for('admin_dashboard'))
@@ -820,7 +758,9 @@ def edit_parking(lot_id):
             return render_template('edit_parking_lot.html', lot=lot)
 
         
+        bump_versions('lots')
         db.session.commit()
+        invalidate_lot_reference_data(lot_id)
         flash("Parking Lot updated successfully!", "success")
         return redirect(url_for('admin_dashboard'))
 
@@ -832,47 +772,33 @@ def edit_parking(lot_id):
 @app.route('/admin/parking_spots/<int:lot_id>')
 @admin_required
 def parking_spots(lot_id):
-    # call the new helper function to update statuses ---
-    update_spot_statuses_and_counts() 
-    
-    lot = ParkingLot.query.get(lot_id)
+    lot = get_lot(lot_id)
     if not lot:
         flash("Parking Lot not found!", "danger")
         return redirect(url_for('admin_dashboard'))
 
-    all_spots = ParkingSpot.query.filter_by(lot_id=lot_id).all()
-    
-    spots_for_display = []
-    now = datetime.now()
+    # the grid itself is rendered client side from spot_grid below, in pages,
+    # so page weight stays the same however many spots the lot has
+    return render_template('parking_spots.html', lot=lot,
+                           total_spots_count=lot.total_spots,
+                           occupied_physical_spots_count=lot.occupied_spots)
 
-    for spot in all_spots:
-        display_status = spot.status  # display status for spot color not text at start same as spot.status
-        
-        # check for any future bookings
-        future_bookings = UserBookings.query.filter(
-            UserBookings.spot_id == spot.spot_id,
-            UserBookings.parking_time > now 
-        ).first()
-
-        if spot.status == 'O':
-            display_status = 'O'
-        elif spot.status == 'A' and future_bookings:
-            display_status = 'F' # F for available but Booked for future color
-        else:
-            display_status = 'A'
 
-        spots_for_display.append({
-            'spot_id': spot.spot_id,
-            'status': spot.status,  # actual status shown will be A or O only
-            'display_status': display_status # Status for coloring the grid A, O, F
-        })
-
-    total_spots_count = len(all_spots)
-    occupied_physical_spots_count = sum(1 for spot in all_spots if spot.status == 'O')
+# ---------------------------
+# SPOT GRID OF A LOT (COMPACT JSON) - ADMIN
+# ---------------------------
+@app.route('/admin/lot/<int:lot_id>/spot-grid')
+@admin_required
+def spot_grid(lot_id):
+    lot = get_lot(lot_id)
+    if not lot:
+        return {"error": "Parking Lot not found"}, 404
 
-    return render_template('parking_spots.html', lot=lot, spots=spots_for_display, 
-                           total_spots_count=total_spots_count,
-                           occupied_physical_spots_count=occupied_physical_spots_count)
+    response = jsonify({'lot_id': lot_id, **encode_spot_grid(load_spot_grid(lot_id))})
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 # ---------------------------
 # FETCH DETAIL OF SPOT - ADMIN
@@ -880,84 +806,58 @@ def parking_spots(lot_id):
 @app.route('/admin/spot-details/<int:spot_id>')   
 @admin_required
 def spot_details(spot_id):
+    spot_data = load_spot_details(spot_ids=[spot_id]).get(spot_id)
+    if not spot_data:
+        return {"error": "Spot not found"}, 404
 
-    # in case users spot status got updated right before this action
-    update_spot_statuses_and_counts()
+    return spot_data, 200
 
-    spot = ParkingSpot.query.get(spot_id)
-    if not spot:
-        return {"error": "Spot not found"}, 404
 
-    now = datetime.now()
+# ---------------------------
+# FETCH DETAILS OF ALL SPOTS IN A LOT (BATCH) - ADMIN
+# optional ?spot_ids=1,2,3 limits it to those spots. Supports ETag/If-None-Match
+# so an unchanged grid costs a 304.
+# ---------------------------
+@app.route('/admin/lot/<int:lot_id>/spot-details')
+@admin_required
+def lot_spot_details(lot_id):
+    spot_ids = None
+    spot_ids_arg = request.args.get('spot_ids')
+    if spot_ids_arg:
+        try:
+            spot_ids = [int(spot_id) for spot_id in spot_ids_arg.split(',') if spot_id]
+        except ValueError:
+            return {"error": "spot_ids must be a comma separated list of numbers"}, 400
+
+    details = load_spot_details(lot_id=lot_id, spot_ids=spot_ids)
+    if not details and not get_lot(lot_id):
+        return {"error": "Parking Lot not found"}, 404
+
+    response = jsonify({'lot_id': lot_id, 'spots': details})
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True # always revalidate, unchanged data comes back as 304
+    return response.make_conditional(request)
 
-    current_booking = UserBookings.query.filter(
-        UserBookings.spot_id == spot_id,
-        UserBookings.parking_time <= now,
-        UserBookings.leaving_time > now
-    ).first()
-
-    future_bookings = UserBookings.query.filter(
-        UserBookings.spot_id == spot_id,
-        UserBookings.parking_time > now # starts in the future
-    ).order_by(UserBookings.parking_time.asc()).all()
-
-    response_data = {
-        'spot_id': spot.spot_id, 
-        'spot_status': spot.status, 
-        'current_occupied': False, # Default to False
-        'current_booking_details': None, # Default to None
-        'future_bookings_details': [], # Default to empty list
-        'is_deletable': False # Default to False we set True if conditions met
-    }
-
-    # determine if the spot is deletable
-    # a spot is deletable only if it has no current or future bookings.
-    is_deletable = not current_booking and not future_bookings
-    response_data['is_deletable'] = is_deletable 
-
-    if current_booking:
-        user = current_booking.user
-        response_data['current_occupied'] = True
-        # check if user exists before accessing attributes
-        if user:
-            response_data['current_booking_details'] = {
-                "user_name": user.user_name,
-                "email": user.email_id,
-                "vehicle_no": current_booking.vehicle_no,
-                "parking_time": current_booking.parking_time.strftime("%d-%m-%Y %H:%M"),
-                "leaving_time": current_booking.leaving_time.strftime("%d-%m-%Y %H:%M"),
-                "parking_cost": str(current_booking.parking_cost)
-            }
-        else:
-            response_data['current_booking_details'] = {
-                "user_name": "Unknown User (ID: {})".format(current_booking.user_id),
-                "email": "N/A",
-                "vehicle_no": current_booking.vehicle_no,
-                "parking_time": current_booking.parking_time.strftime("%d-%m-%Y %H:%M"),
-                "leaving_time": current_booking.leaving_time.strftime("%d-%m-%Y %H:%M"),
-                "parking_cost": str(current_booking.parking_cost)
-            }
-
-
-    if future_bookings:
-        for fb in future_bookings:
-            # check if user exists before accessing attributes
-            if fb.user:
-                response_data['future_bookings_details'].append({
-                    "user_name": fb.user.user_name, 
-                    "vehicle_no": fb.vehicle_no,
-                    "parking_time": fb.parking_time.strftime("%d-%m-%Y %H:%M"),
-                    "leaving_time": fb.leaving_time.strftime("%d-%m-%Y %H:%M")
-                })
-            else:
-                response_data['future_bookings_details'].append({
-                    "user_name": "Unknown User (ID: {})".format(fb.user_id),
-                    "vehicle_no": fb.vehicle_no,
-                    "parking_time": fb.parking_time.strftime("%d-%m-%Y %H:%M"),
-                    "leaving_time": fb.leaving_time.strftime("%d-%m-%Y %H:%M")
-                })
-    
-    return response_data, 200
+
+# ---------------------------
+# SWEEPER STATS - ADMIN
+# ---------------------------
+@app.route('/admin/sweeper-stats')
+@admin_required
+def sweeper_stats():
+    # counters are per worker process, holder_id tells which worker answered
+    return get_sweep_stats(), 200
+
+
+# ---------------------------
+# CACHE STATS - ADMIN
+# ---------------------------
+@app.route('/admin/cache-stats')
+@admin_required
+def cache_stats():
+    # per worker process, like the sweeper stats
+    return all_cache_stats(), 200
 
 
 # ---------------------------
@@ -966,17 +866,49 @@ def spot_details(spot_id):
 @app.route('/admin/add_spot/<int:lot_id>', methods=['POST'])
 @admin_required
 def add_spot(lot_id):
-    lot = ParkingLot.query.get(lot_id)
+    lot = get_lot(lot_id)
     if not lot:
         flash("Parking Lot not found!", "danger")
         return redirect(url_for('admin_dashboard'))
     
     new_spot = ParkingSpot(lot_id=lot.lot_id, status='A')
     db.session.add(new_spot)
+    adjust_lot_counters(lot.lot_id, total=1)
+    bump_versions('spots')
     db.session.commit()
+    invalidate_lot_index(lot.lot_id)
+    invalidate_lot_reference_data(lot.lot_id)
     flash(f"New spot added to {lot.primelocation_name}!", "success")
     return redirect(url_for('parking_spots', lot_id=lot.lot_id))
 
+# ---------------------------
+# RESIZE PARKING LOT TO N SPOTS - INSIDE parking_lot MANAGE PAGE
+# ---------------------------
+@app.route('/admin/resize_lot/<int:lot_id>', methods=['POST'])
+@admin_required
+def resize_parking_lot(lot_id):
+    lot = get_lot(lot_id)
+    if not lot:
+        flash("Parking Lot not found!", "danger")
+        return redirect(url_for('admin_dashboard'))
+
+    try:
+        target_spots = int(request.form.get('target_spots', ''))
+        report = resize_lot(lot.lot_id, target_spots)
+    except ValueError as error:
+        flash(f"Invalid number of spots: {error}", "danger")
+        return redirect(url_for('parking_spots', lot_id=lot.lot_id))
+    invalidate_lot_index(lot.lot_id)
+    invalidate_lot_reference_data(lot.lot_id)
+
+    if report['kept_booked']:
+        flash(f"{lot.primelocation_name} now has {report['after']} spots. {report['kept_booked']} spot(s) "
+              f"could not be removed as they have current or future bookings.", "warning")
+    else:
+        flash(f"{lot.primelocation_name} now has {report['after']} spots "
+              f"({report['added']} added, {report['removed']} removed).", "success")
+    return redirect(url_for('parking_spots', lot_id=lot.lot_id))
+
 # ---------------------------
 # DELETE SPOT IN PARKING LOT- INSIDE parking_lot MANAGE PAGE
 # ---------------------------
@@ -987,19 +919,21 @@ def delete_spot(spot_id):
     if not spot:
         return {"error": "Spot not found"}, 404
 
-    # check if there are any active bookings (current or future) for this spot
-    active_booking_for_spot = UserBookings.query.filter(
-        UserBookings.spot_id == spot_id,
-        UserBookings.leaving_time > datetime.now() # Booking is not yet expired
-    ).first()
+    lot = get_lot(spot.lot_id)
+    lot_id = spot.lot_id
+
+    # only deletes the spot while it has no current or future booking
+    deleted = delete_without_live_bookings(lot_id, [spot_id], lambda has_live_booking: delete(ParkingSpot).where(
+        ParkingSpot.spot_id == spot_id, ~has_live_booking(UserBookings.spot_id == spot_id)
+    ))
+    db.session.commit() # also keeps the expired bookings moved to history when refused
 
-    if active_booking_for_spot:
+    if not deleted:
         flash(f"Cannot delete spot {spot_id} as it has an active booking. Please ensure the booking is released first.", "danger")
-        return redirect(url_for('parking_spots', lot_id=spot.lot_id))
-            
-    lot = ParkingLot.query.get(spot.lot_id) 
-    db.session.delete(spot)
-    db.session.commit()
+        return redirect(url_for('parking_spots', lot_id=lot_id))
+
+    invalidate_lot_index(lot_id)
+    invalidate_lot_reference_data(lot_id)
     flash("Spot deleted successfully!", "success")
     # NEW: Check if lot exists before redirecting
     if lot:
@@ -1014,16 +948,17 @@ def delete_spot(spot_id):
 @app.route('/admin/summary')
 @admin_required
 def admin_summary():
-    # most booked lots from booking history only
+    reporting = get_reporting_session() # read-only snapshot when reporting mode is on
+
+    # most booked lots from booking history only (the per lot per day rollup)
     lot_data = (
-        db.session.query(
+        reporting.query(
             ParkingLot.primelocation_name, 
-            func.count(UserHistory.id) # count only from userhistory
+            func.sum(LotDailyRollup.booking_count)
         )
-        .join(ParkingSpot, ParkingSpot.lot_id == ParkingLot.lot_id)
-        .join(UserHistory, UserHistory.spot_id == ParkingSpot.spot_id)
+        .join(LotDailyRollup, LotDailyRollup.lot_id == ParkingLot.lot_id)
         .group_by(ParkingLot.primelocation_name)
-        .order_by(func.count(UserHistory.id).desc())
+        .order_by(func.sum(LotDailyRollup.booking_count).desc())
         .limit(5)
         .all()
     )
@@ -1032,15 +967,15 @@ def admin_summary():
     labels = [row[0] for row in lot_data]
     counts = [row[1] for row in lot_data]
 
-    # totals counts for display
-    total_users = User.query.count()
-    total_lots = ParkingLot.query.count()
-    
-    # total bookings, currently booked either occupied or future
-    total_bookings = UserBookings.query.count() 
-    
-    # Total history records
-    total_history = UserHistory.query.count()
+    # totals counts for display, in one round trip:
+    # users, lots, current bookings (occupied or future) and live history records
+    total_users, total_lots, total_bookings, total_history = reporting.execute(select(
+        select(func.count(User.user_id)).scalar_subquery(),
+        select(func.count(ParkingLot.lot_id)).scalar_subquery(),
+        select(func.count(UserBookings.id)).scalar_subquery(),
+        select(func.count(UserHistory.id)).scalar_subquery()
+    )).one()
+    total_history += get_archived_row_count(reporting) # plus archived records
 
     return render_template(
         'admin_summary.html',
@@ -1049,15 +984,46 @@ def admin_summary():
         total_users=total_users,
         total_lots=total_lots,
         total_bookings=total_bookings,
-        total_history=total_history
+        total_history=total_history,
+        snapshot_taken_at=get_snapshot_taken_at()
     )
 
+# -------------------------
+# EXPORT BOOKINGS/HISTORY (STREAMED CSV/JSONL) - ADMIN
+# ?format=csv|jsonl&from=YYYY-MM-DD&to=YYYY-MM-DD&lot_id=N&gzip=1
+# -------------------------
+@app.route('/admin/export/<dataset>')
+@admin_required
+def export_data(dataset):
+    fmt = request.args.get('format', 'csv')
+    if dataset not in EXPORT_DATASETS or fmt not in EXPORT_FORMATS:
+        return {"error": f"dataset must be one of {', '.join(EXPORT_DATASETS)}, format one of {', '.join(EXPORT_FORMATS)}"}, 400
+    try:
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+    except ValueError:
+        return {"error": "from/to must be dates in YYYY-MM-DD format"}, 400
+    lot_id = request.args.get('lot_id', type=int)
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes', 'on')
+
+    # read in short keyset batches (from the reporting snapshot when on), so a slow
+    # download never holds a read lock that would block booking commits
+    chunks = iter_export(get_reporting_session(), dataset, fmt, date_from, date_to, lot_id, compress)
+    if compress:
+        mimetype = 'application/gzip'
+    else:
+        mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(dataset, fmt, compress)}"'
+    return response
+
 # -------------------------
 # ADMIN SEARCH
 # -------------------------
 @app.route('/admin/search', methods=['GET', 'POST'])
 @admin_required
 def admin_search():
+    reporting = get_reporting_session() # read-only snapshot when reporting mode is on
     user_result = None
     parking_lots_result = None
     search_type = request.form.get('search_type', '')
@@ -1071,7 +1037,7 @@ def admin_search():
             if not user_email_id and not user_id_str:
                 flash("Please enter either User Email ID or User ID.", "warning")
             else:
-                query = User.query
+                query = reporting.query(User)
                 if user_email_id:
                     query = query.filter_by(email_id=user_email_id)
                 if user_id_str:
@@ -1088,29 +1054,24 @@ def admin_search():
 
         elif 'submit_parking_lot_search' in request.form:
             search_type = 'search_parking_lot'
+            lot_query = (request.form.get('q') or '').strip()
             city = request.form.get('city')
             pincode = request.form.get('pincode')
 
-            if not city and not pincode:
-                flash("Please enter either City or Pincode.", "warning")
+            if not lot_query and not city and not pincode:
+                flash("Please enter a search text, City or Pincode.", "warning")
             else:
-                query = ParkingLot.query
-                if city:
-                    query = query.filter_by(city=city)
-                if pincode:
-                    query = query.filter_by(pincode=pincode)
-                
-                parking_lots = query.all()
+                if lot_query: # free text, ranked
+                    parking_lots = load_lots_in_order(search_lot_ids_by_text(lot_query, reporting), reporting)
+                else:
+                    query = reporting.query(ParkingLot)
+                    if city:
+                        query = query.filter_by(city=city)
+                    if pincode:
+                        query = query.filter_by(pincode=pincode)
+                    parking_lots = query.order_by(ParkingLot.lot_id).all()
                 # calc stats for search results
-                lots_with_stats = []
-                for lot in parking_lots:
-                    total_spots = ParkingSpot.query.filter_by(lot_id=lot.lot_id).count()
-                    occupied_physical_spots = ParkingSpot.query.filter_by(lot_id=lot.lot_id, status='O').count()
-                    lots_with_stats.append({
-                        'lot': lot,
-                        'total_spots': total_spots,
-                        'occupied_physical_spots': occupied_physical_spots
-                    })
+                lots_with_stats = attach_lot_stats(parking_lots)
                 parking_lots_result = lots_with_stats # Assign the list with stats
 
                 if not parking_lots_result:
@@ -1119,7 +1080,8 @@ def admin_search():
     return render_template('admin_search.html', 
                            user_result=user_result, 
                            parking_lots_result=parking_lots_result, # now contains stats
-                           search_type=search_type)
+                           search_type=search_type,
+                           snapshot_taken_at=get_snapshot_taken_at())
 
 # -------------------------
 # ADMIN: ALL USERS
@@ -1127,5 +1089,31 @@ def admin_search():
 @app.route('/admin/users')
 @admin_required # 
 def admin_users():
-    users = User.query.all() # fetch all users from the database
-    return render_template('admin_allusers.html', users=users)
+    users = get_reporting_session().query(User).all() # fetch all users (from the reporting snapshot when on)
+    return render_template('admin_allusers.html', users=users, snapshot_taken_at=get_snapshot_taken_at(),
+                           inactive_months=app.config['USER_INACTIVE_MONTHS'])
+
+
+# -------------------------
+# PURGE INACTIVE USERS-admin, one batch per POST
+# -------------------------
+@app.route('/admin/purge_inactive_users', methods=['POST'])
+@admin_required
+def purge_inactive_users_batch_route():
+    try:
+        months = int(request.form.get('months', app.config['USER_INACTIVE_MONTHS']))
+    except ValueError:
+        months = -1
+    if months < 1:
+        flash("Inactive months must be a whole number of at least 1.", "danger")
+        return redirect(url_for('admin_users'))
+
+    # one bounded batch per request, posting again continues where this one stopped
+    cutoff = inactive_cutoff(months)
+    purged = purge_inactive_users_batch(cutoff)
+    remaining = count_inactive_users(cutoff)
+    if remaining:
+        flash(f"Purged {purged} user(s) inactive since {cutoff:%Y-%m-%d}, {remaining} left. Purge again to continue.", "warning")
+    else:
+        flash(f"Purged {purged} user(s) inactive since {cutoff:%Y-%m-%d}, none left.", "success")
+    return redirect(url_for('admin_users'))
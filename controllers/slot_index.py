@@ -0,0 +1,193 @@
+# slot_index.py
+# in-memory per-lot bitmap of busy 15-minute slots, so "is any spot free for
+# [t1, t2)" and "which spot" are bitwise checks instead of SQL. A bitmap is
+# only used while the 'bookings' change version is the one it was built at, so
+# a booking or release in any worker drops it on this worker's next version check.
+import threading
+import time
+from datetime import datetime, timedelta
+from app import app
+from models.dbmodel import db, UserBookings, ParkingSpot
+from .availability import find_free_spot_ids as find_free_spot_ids_sql, is_spot_free
+from .change_versions import on_change, check_change_versions, seen_version
+
+
+SLOT_LENGTH = timedelta(minutes=15)
+SLOT_EPOCH = datetime(2000, 1, 1) # slot numbers count from here
+
+_lot_indexes = {}
+_lot_indexes_lock = threading.Lock()
+
+
+def slot_floor(moment):
+    """number of the slot containing `moment`"""
+    return (moment - SLOT_EPOCH) // SLOT_LENGTH
+
+
+def slot_ceil(moment):
+    """number of the first slot starting at or after `moment`"""
+    return -((SLOT_EPOCH - moment) // SLOT_LENGTH)
+
+
+class LotSlotIndex:
+    """
+    busy slots of every spot in one lot, one int bitset per spot where bit i is
+    slot base_slot + i. A booking sets every slot it touches, so the bitmap is a
+    superset of the real bookings: a spot free in the bitmap is really free (for
+    the bookings this index knows of), a busy one may just share a partial slot.
+    """
+
+    def __init__(self, lot_id, base_slot, bookings_version=None):
+        self.lot_id = lot_id
+        self.base_slot = base_slot
+        self.bookings_version = bookings_version # 'bookings' change version it was built at
+        self.masks = {} # spot_id -> int, in spot_id order
+        self.built_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def slide_to(self, base_slot):
+        """moves the grid forward in time, slots that have passed drop off the low end"""
+        shift = base_slot - self.base_slot
+        if shift <= 0:
+            return
+        for spot_id, mask in self.masks.items():
+            self.masks[spot_id] = mask >> shift
+        self.base_slot = base_slot
+
+    def window_mask(self, parking_time, leaving_time):
+        first = max(slot_floor(parking_time) - self.base_slot, 0)
+        last = slot_ceil(leaving_time) - self.base_slot # exclusive
+        if last <= first:
+            return 0
+        return ((1 << (last - first)) - 1) << first
+
+    def mark(self, spot_id, parking_time, leaving_time):
+        self.masks[spot_id] = self.masks.get(spot_id, 0) | self.window_mask(parking_time, leaving_time)
+
+    def free_spot_ids(self, parking_time, leaving_time, limit=None):
+        window = self.window_mask(parking_time, leaving_time)
+        free = []
+        for spot_id, mask in self.masks.items():
+            if not mask & window:
+                free.append(spot_id)
+                if limit and len(free) >= limit:
+                    break
+        return free
+
+
+def build_lot_index(lot_id, now=None, session=None):
+    """
+    builds the index of a lot from user_bookings: one query for the spots and
+    one for the live bookings of the lot.
+    """
+    now = now or datetime.now()
+    session = session or db.session
+    # read before the bookings: a booking committed meanwhile is at worst in the
+    # bitmap already while the version says rebuild
+    index = LotSlotIndex(lot_id, slot_floor(now), seen_version('bookings'))
+
+    spot_ids = session.query(ParkingSpot.spot_id).filter(
+        ParkingSpot.lot_id == lot_id
+    ).order_by(ParkingSpot.spot_id).all()
+    for row in spot_ids:
+        index.masks[row.spot_id] = 0
+
+    live_bookings = session.query(
+        UserBookings.spot_id, UserBookings.parking_time, UserBookings.leaving_time
+    ).join(ParkingSpot).filter(
+        ParkingSpot.lot_id == lot_id,
+        UserBookings.leaving_time > now
+    ).all()
+    for booking in live_bookings:
+        index.mark(booking.spot_id, booking.parking_time, booking.leaving_time)
+
+    return index
+
+
+def get_lot_index(lot_id):
+    """
+    the index of a lot, rebuilt lazily when missing, built at an older 'bookings'
+    change version (a booking or release in any worker) or older than
+    SLOT_INDEX_MAX_AGE_SECONDS, and slid to the current slot.
+    """
+    now = datetime.now()
+    check_change_versions() # throttled, usually already done for this request
+    index = _lot_indexes.get(lot_id)
+    if (index is None or index.bookings_version != seen_version('bookings')
+            or time.monotonic() - index.built_at > app.config['SLOT_INDEX_MAX_AGE_SECONDS']):
+        index = build_lot_index(lot_id, now)
+        with _lot_indexes_lock:
+            _lot_indexes[lot_id] = index
+    with index.lock:
+        index.slide_to(slot_floor(now))
+    return index
+
+
+def find_free_spot_ids(lot_id, parking_time, leaving_time, limit=None):
+    """
+    free spots for the window from the bitmap, falling back to the exact SQL search
+    when the bitmap finds none (it can report a spot busy over a partial slot).
+    """
+    index = get_lot_index(lot_id)
+    with index.lock:
+        free = index.free_spot_ids(parking_time, leaving_time, limit)
+    return free or find_free_spot_ids_sql(lot_id, parking_time, leaving_time, limit)
+
+
+def allocate_spot_id(lot_id, parking_time, leaving_time):
+    """
+    spot to book for the window, or None if the lot is full. The bitmap candidate is
+    confirmed against the db, since this worker may not know bookings made elsewhere.
+    """
+    candidates = find_free_spot_ids(lot_id, parking_time, leaving_time, limit=1)
+    if candidates and is_spot_free(lot_id, candidates[0], parking_time, leaving_time):
+        return candidates[0]
+
+    # stale bitmap, rebuild it and use the exact search
+    invalidate_lot_index(lot_id)
+    candidates = find_free_spot_ids_sql(lot_id, parking_time, leaving_time, limit=1)
+    return candidates[0] if candidates else None
+
+
+# -----------------------------
+# UPDATES FROM WRITES IN THIS WORKER
+# -----------------------------
+def note_booking_confirmed(lot_id, spot_id, parking_time, leaving_time):
+    index = _lot_indexes.get(lot_id)
+    if index is not None:
+        with index.lock:
+            index.mark(spot_id, parking_time, leaving_time)
+
+
+def note_booking_released(lot_id, spot_id):
+    """
+    bits cannot simply be cleared (a neighbouring booking may share the edge slot),
+    so the released spots mask is rebuilt from its remaining live bookings.
+    """
+    index = _lot_indexes.get(lot_id)
+    if index is None:
+        return
+    now = datetime.now()
+    live_bookings = db.session.query(UserBookings.parking_time, UserBookings.leaving_time).filter(
+        UserBookings.spot_id == spot_id,
+        UserBookings.leaving_time > now
+    ).all()
+    with index.lock:
+        index.masks[spot_id] = 0
+        for booking in live_bookings:
+            index.mark(spot_id, booking.parking_time, booking.leaving_time)
+
+
+def invalidate_lot_index(lot_id):
+    """drops the index of a lot after its spots change, it is rebuilt on next use"""
+    with _lot_indexes_lock:
+        _lot_indexes.pop(lot_id, None)
+
+
+def invalidate_all_lot_indexes():
+    with _lot_indexes_lock:
+        _lot_indexes.clear()
+
+
+# spots added or deleted in another worker (bookings are caught by the version check)
+on_change('spots', invalidate_all_lot_indexes)
@@ -0,0 +1,105 @@
+# spot_details.py
+# current/future booking details of parking spots for the admin spot grid,
+# for one spot or a whole lot in a single joined query
+from datetime import datetime
+from sqlalchemy import and_, case, exists
+from models.dbmodel import db, ParkingSpot, UserBookings, User
+
+
+def _booking_user_details(booking, user):
+    # check if user exists before accessing attributes
+    if user:
+        return {"user_name": user.user_name, "email": user.email_id}
+    return {"user_name": "Unknown User (ID: {})".format(booking.user_id), "email": "N/A"}
+
+
+def load_spot_details(lot_id=None, spot_ids=None):
+    """
+    returns {spot_id: details} for the spots of a lot and/or a list of spot ids.
+    Spots, their live bookings and the booking users come from one outer-joined
+    query, ordered so each spot's bookings arrive in parking_time order.
+    """
+    now = datetime.now()
+    query = db.session.query(ParkingSpot, UserBookings, User).outerjoin(
+        UserBookings, and_(UserBookings.spot_id == ParkingSpot.spot_id, UserBookings.leaving_time > now)
+    ).outerjoin(
+        User, User.user_id == UserBookings.user_id
+    )
+    if lot_id is not None:
+        query = query.filter(ParkingSpot.lot_id == lot_id)
+    if spot_ids is not None:
+        query = query.filter(ParkingSpot.spot_id.in_(spot_ids))
+
+    details = {}
+    for spot, booking, user in query.order_by(ParkingSpot.spot_id, UserBookings.parking_time):
+        spot_data = details.get(spot.spot_id)
+        if spot_data is None:
+            spot_data = details[spot.spot_id] = {
+                'spot_id': spot.spot_id,
+                'spot_status': spot.status,
+                'current_occupied': False, # Default to False
+                'current_booking_details': None, # Default to None
+                'future_bookings_details': [], # Default to empty list
+                'is_deletable': True # a spot is deletable only if it has no current or future bookings
+            }
+        if booking is None:
+            continue
+
+        spot_data['is_deletable'] = False
+        user_details = _booking_user_details(booking, user)
+        if booking.parking_time <= now and spot_data['current_booking_details'] is None:
+            spot_data['current_occupied'] = True
+            spot_data['current_booking_details'] = {
+                **user_details,
+                "vehicle_no": booking.vehicle_no,
+                "parking_time": booking.parking_time.strftime("%d-%m-%Y %H:%M"),
+                "leaving_time": booking.leaving_time.strftime("%d-%m-%Y %H:%M"),
+                "parking_cost": str(booking.parking_cost)
+            }
+        elif booking.parking_time > now: # starts in the future
+            spot_data['future_bookings_details'].append({
+                "user_name": user_details["user_name"],
+                "vehicle_no": booking.vehicle_no,
+                "parking_time": booking.parking_time.strftime("%d-%m-%Y %H:%M"),
+                "leaving_time": booking.leaving_time.strftime("%d-%m-%Y %H:%M")
+            })
+    return details
+
+
+def load_spot_grid(lot_id):
+    """
+    [(spot_id, display_status)] for every spot of the lot in spot_id order, from one query.
+    display_status is 'O' occupied, 'F' available but booked for the future, 'A' available.
+    """
+    now = datetime.now()
+    has_future_booking = exists().where(
+        UserBookings.spot_id == ParkingSpot.spot_id,
+        UserBookings.parking_time > now
+    )
+    rows = db.session.query(
+        ParkingSpot.spot_id,
+        case(
+            (ParkingSpot.status == 'O', 'O'),
+            (has_future_booking, 'F'),
+            else_='A'
+        ).label('display_status')
+    ).filter(ParkingSpot.lot_id == lot_id).order_by(ParkingSpot.spot_id)
+    return [(row.spot_id, row.display_status) for row in rows]
+
+
+def encode_spot_grid(grid):
+    """
+    compact form of load_spot_grid() for the client: spot ids as runs of
+    consecutive ids [[first_id, length], ...] and one status character per spot.
+    """
+    id_runs = []
+    for spot_id, _ in grid:
+        if id_runs and id_runs[-1][0] + id_runs[-1][1] == spot_id:
+            id_runs[-1][1] += 1
+        else:
+            id_runs.append([spot_id, 1])
+    return {
+        'count': len(grid),
+        'ids': id_runs,
+        'status': ''.join(display_status for _, display_status in grid)
+    }
@@ -0,0 +1,417 @@
+# sweeper.py
+# background worker that activates and expires bookings on a fixed schedule,
+# so request handlers only ever read spot/booking state
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_, select, func, insert, update, delete, literal, cast, union
+from sqlalchemy.exc import IntegrityError
+from models.dbmodel import db, User, UserBookings, UserHistory, ParkingSpot, UserNotification, SweeperLease, refresh_lot_counters, \
+    bump_versions
+from app import app
+from .change_versions import on_change, check_change_versions
+from .retention import notification_retention_due, run_notification_retention
+from .rollups import rollup_bookings
+from .reporting import reporting_snapshot_due, refresh_reporting_snapshot
+
+
+LEASE_NAME = 'booking_sweeper'
+
+_sweeper_thread = None
+_sweeper_lock = threading.Lock()
+_stop_event = threading.Event()
+_holder_id = None
+
+# earliest moment a booking activates or expires. None means unknown (sweep on next call),
+# datetime.max means nothing is scheduled at all.
+_next_event_at = None
+_last_sweep_at = None
+_sweep_stats_lock = threading.Lock()
+sweep_stats = {'executed': 0, 'skipped': 0}
+
+ACTIVATED_MESSAGE_SUFFIX = " is now active. Please proceed to your spot."
+EXPIRED_MESSAGE = "Some of your past bookings have expired and are moved to history. Please evacuate the parking spot if you haven't already."
+
+
+# -----------------------------
+# HELPER FUNCTION:
+# moves expired bookings to history. Used by the sweeper, and before spots are
+# deleted so the FK cascade never drops a booking that was not moved yet
+# (also `flask migrate-tables`, for bookings left without their spot or user).
+# -----------------------------
+def expired_history_select(is_expired):
+    """
+    the history rows of the bookings matching is_expired, in expiry order: read
+    straight off ix_user_bookings_leaving_time (ordering by id alone makes SQLite
+    walk the whole table in rowid order instead).
+    """
+    return (
+        select(UserBookings.user_id, UserBookings.spot_id, UserBookings.parking_time,
+               UserBookings.leaving_time, UserBookings.parking_cost, UserBookings.vehicle_no)
+        .where(is_expired)
+        .order_by(UserBookings.leaving_time, UserBookings.id)
+    )
+
+
+def release_expired_bookings(now, *criteria):
+    """
+    moves the bookings that ended by now (and match criteria) to UserHistory in
+    the current transaction, see release_bookings. Returns the number moved.
+    """
+    return release_bookings(now, UserBookings.leaving_time <= now, *criteria)
+
+
+def release_bookings(now, *criteria):
+    """
+    moves the bookings matching criteria to UserHistory in the current transaction:
+    frees their spots, notifies their users (at now), updates the rollups and
+    deletes them. Returns the number of bookings moved.
+    """
+    is_expired = and_(*criteria)
+
+    # move expired bookings to UserHistory
+    moved_to_history = db.session.execute(
+        insert(UserHistory).from_select(
+            ['user_id', 'spot_id', 'booking_time', 'leaving_time', 'parking_cost', 'vehicle_no'],
+            expired_history_select(is_expired)
+        )
+    ).rowcount
+
+    if moved_to_history:
+        # freeing spots that were occupied by an expired booking. A booking that starts
+        # on the same spot is re-activated (and notified) by the next activation step
+        db.session.execute(
+            update(ParkingSpot)
+            .where(
+                ParkingSpot.status == 'O',
+                ParkingSpot.spot_id.in_(select(UserBookings.spot_id).where(is_expired))
+            )
+            .values(status='A')
+            .execution_options(synchronize_session=False)
+        )
+
+        # adding a single "expired" message for each user who had bookings expire
+        db.session.execute(
+            insert(UserNotification).from_select(
+                ['user_id', 'message_category', 'message_text', 'created_at', 'is_read'],
+                select(
+                    UserBookings.user_id,
+                    literal('warning'),
+                    literal(EXPIRED_MESSAGE),
+                    literal(now, db.DateTime),
+                    literal(False, db.Boolean)
+                ).where(is_expired).distinct()
+            )
+        )
+        db.session.execute(
+            update(User)
+            .where(User.user_id.in_(select(UserBookings.user_id).where(is_expired)))
+            .values(unread_notifications=User.unread_notifications + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+        rollup_bookings(is_expired) # summary rollups, while the rows still exist
+
+        db.session.execute(
+            delete(UserBookings).where(is_expired).execution_options(synchronize_session=False)
+        )
+
+
+    return moved_to_history
+
+
+def _activates(now):
+    """criteria of the bookings that have started by now on a spot still marked free"""
+    return (UserBookings.parking_time <= now, UserBookings.leaving_time > now, ParkingSpot.status == 'A')
+
+
+def affected_lots_select(now):
+    """
+    lots with a booking that expires or activates at now, their counters change.
+    A UNION so each half walks ix_user_bookings_leaving_time, an OR across both
+    tables would scan every spot.
+    """
+    return union(
+        select(ParkingSpot.lot_id).join(UserBookings, UserBookings.spot_id == ParkingSpot.spot_id)
+        .where(UserBookings.leaving_time <= now),
+        select(ParkingSpot.lot_id).join(UserBookings, UserBookings.spot_id == ParkingSpot.spot_id)
+        .where(*_activates(now))
+    )
+
+
+def activation_notifications_select(now):
+    """the "booking is now active" notification rows of the bookings activating at now"""
+    return (
+        select(
+            UserBookings.user_id,
+            literal('info'),
+            literal('Booked spot ') + cast(UserBookings.spot_id, db.String) + literal(ACTIVATED_MESSAGE_SUFFIX),
+            literal(now, db.DateTime),
+            literal(False, db.Boolean)
+        )
+        .join(ParkingSpot, ParkingSpot.spot_id == UserBookings.spot_id)
+        .where(*_activates(now))
+    )
+
+
+# -----------------------------
+# HELPER FUNCTION:
+# To update spot statuses and store messages persistently
+# This function only stores notifications in the db. It does not flash them directly.
+# Called by the sweeper (under the lease), never from a request handler.
+# -----------------------------
+
+def update_spot_statuses_and_counts():
+    """
+    updates parking spot statuses and stores flash messages persistently
+    in the database for relevant users.
+    This function does not return messages for immediate flashing.
+    Returns without touching the db until the cached next event time has passed.
+    """
+    global _next_event_at, _last_sweep_at
+    now = datetime.now()
+
+    # --- short-circuit: nothing activates or expires before _next_event_at ---
+    # no query at all on this path. Bookings confirmed in other workers bump the
+    # 'bookings' change version, which resets the cache (note_booking_change) when
+    # this worker polls the versions (requests, run_sweeper_tick).
+    # SWEEPER_MAX_SKIP_SECONDS stays as a backstop.
+    max_skip = timedelta(seconds=app.config['SWEEPER_MAX_SKIP_SECONDS'])
+    if _next_event_at is not None and now < _next_event_at and now - _last_sweep_at < max_skip:
+        _count_sweep('skipped')
+        return
+    
+    # all transitions are set-based statements in one transaction, so the cost does not
+    # grow with one ORM object (plus a lazy spot load) per expired booking.
+    # Expiry runs before activation so a back-to-back booking on the same spot
+    # (one ends when the next starts) is activated in the same sweep.
+
+    # --- release booking on expiry ---
+    # lots touched by this sweep, their counters are recomputed at the end
+    affected_lot_ids = db.session.scalars(affected_lots_select(now)).all()
+
+    moved_to_history = release_expired_bookings(now)
+
+    # --- activating bookings ---
+    # notifications are written first, while the spots are still marked 'A'
+    activation_notifications = db.session.execute(
+        insert(UserNotification).from_select(
+            ['user_id', 'message_category', 'message_text', 'created_at', 'is_read'],
+            activation_notifications_select(now)
+        )
+    ).rowcount
+
+    if activation_notifications:
+        # one notification per activating booking, counted before their spots stop being 'A'
+        activating = (
+            select(func.count(UserBookings.id))
+            .join(ParkingSpot, ParkingSpot.spot_id == UserBookings.spot_id)
+            .where(UserBookings.user_id == User.user_id, *_activates(now))
+        )
+        db.session.execute(
+            update(User)
+            .where(User.user_id.in_(
+                select(UserBookings.user_id)
+                .join(ParkingSpot, ParkingSpot.spot_id == UserBookings.spot_id)
+                .where(*_activates(now))
+            ))
+            .values(unread_notifications=User.unread_notifications + activating.scalar_subquery())
+            .execution_options(synchronize_session=False)
+        )
+        # spots picked from the active bookings, not by a scan of every spot
+        db.session.execute(
+            update(ParkingSpot)
+            .where(
+                ParkingSpot.status == 'A',
+                ParkingSpot.spot_id.in_(
+                    select(UserBookings.spot_id).where(UserBookings.parking_time <= now, UserBookings.leaving_time > now)
+                )
+            )
+            .values(status='O')
+            .execution_options(synchronize_session=False)
+        )
+
+    # commit all changes in one go
+    if moved_to_history or activation_notifications:
+        refresh_lot_counters(affected_lot_ids)
+        bump_versions('notifications') # both steps notify users
+        db.session.commit()
+        check_change_versions(force=True) # this worker sees its own bump right away
+
+    _next_event_at = compute_next_event_at(now)
+    _last_sweep_at = now
+    _count_sweep('executed')
+
+
+# -----------------------------
+# NEXT EVENT CACHE:
+# lets the sweeper skip ticks where nothing can have changed
+# -----------------------------
+def compute_next_event_at(now):
+    """
+    earliest pending activation (parking_time) or expiry (leaving_time) after now,
+    datetime.max if there are no live bookings.
+    """
+    next_activation, next_expiry = db.session.execute(
+        select(
+            select(func.min(UserBookings.parking_time)).where(UserBookings.parking_time > now).scalar_subquery(),
+            select(func.min(UserBookings.leaving_time)).where(UserBookings.leaving_time > now).scalar_subquery()
+        )
+    ).one()
+    events = [t for t in (next_activation, next_expiry) if t is not None]
+    return min(events) if events else datetime.max
+
+
+def note_booking_change(parking_time=None):
+    """
+    keeps the next event cache honest after a booking write in this worker.
+    A new booking only moves the next event earlier, anything else (release/cancel)
+    drops the cache so the next sweep recomputes it.
+    """
+    global _next_event_at
+    if parking_time is not None and _next_event_at is not None:
+        _next_event_at = min(_next_event_at, parking_time)
+    else:
+        _next_event_at = None
+
+
+# bookings written in another worker: their times are unknown here, recompute
+on_change('bookings', note_booking_change)
+
+
+def _count_sweep(outcome):
+    with _sweep_stats_lock:
+        sweep_stats[outcome] += 1
+
+
+def get_sweep_stats():
+    """
+    per-process sweep counters plus the cached next event time.
+    """
+    with _sweep_stats_lock:
+        stats = dict(sweep_stats)
+    stats['next_event_at'] = None if _next_event_at in (None, datetime.max) else _next_event_at.isoformat()
+    stats['last_sweep_at'] = _last_sweep_at.isoformat() if _last_sweep_at else None
+    stats['holder_id'] = get_holder_id()
+    return stats
+
+
+# -----------------------------
+# LEADER LEASE:
+# only the process holding the lease row runs the sweep, so N workers
+# do not repeat the same transitions. A holder that dies simply stops
+# renewing and the lease lapses after SWEEPER_LEASE_SECONDS.
+# -----------------------------
+def get_holder_id():
+    """
+    returns the lease holder id of this process, computed lazily so that
+    forked workers (gunicorn --preload) do not share one id.
+    """
+    global _holder_id
+    if _holder_id is None or not _holder_id.startswith(f"{socket.gethostname()}:{os.getpid()}:"):
+        _holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    return _holder_id
+
+
+def acquire_sweeper_lease():
+    """
+    takes or renews the sweeper lease for this process.
+    Returns True if this process now holds it.
+    """
+    now = datetime.now()
+    holder = get_holder_id()
+    expires_at = now + timedelta(seconds=app.config['SWEEPER_LEASE_SECONDS'])
+
+    # renew our own lease or take over a lapsed one in a single conditional update
+    renewed = SweeperLease.query.filter(
+        SweeperLease.name == LEASE_NAME,
+        or_(SweeperLease.holder == holder, SweeperLease.expires_at <= now)
+    ).update({'holder': holder, 'expires_at': expires_at}, synchronize_session=False)
+
+    if renewed:
+        db.session.commit()
+        return True
+
+    # first run against this db, the lease row does not exist yet
+    if not db.session.get(SweeperLease, LEASE_NAME):
+        db.session.add(SweeperLease(name=LEASE_NAME, holder=holder, expires_at=expires_at))
+        try:
+            db.session.commit()
+            return True
+        except IntegrityError: # another worker created it first
+            db.session.rollback()
+            return False
+
+    db.session.rollback()
+    return False
+
+
+def release_sweeper_lease():
+    """
+    gives up the lease (if held) so another worker can take over right away.
+    """
+    SweeperLease.query.filter_by(name=LEASE_NAME, holder=get_holder_id()).update(
+        {'expires_at': datetime.now()}, synchronize_session=False)
+    db.session.commit()
+
+
+def run_sweeper_tick():
+    """
+    runs one sweep if this process holds (or can take) the lease.
+    Returns True if a sweep was run.
+    """
+    with app.app_context():
+        try:
+            if not acquire_sweeper_lease():
+                return False
+            check_change_versions() # throttled, a dedicated sweeper process serves no requests
+            update_spot_statuses_and_counts()
+            if notification_retention_due():
+                report = run_notification_retention()
+                app.logger.info("Notification retention: %s", report)
+            if reporting_snapshot_due():
+                db.session.commit() # the backup reads through its own connection
+                app.logger.info("Reporting snapshot refreshed in %.2fs.", refresh_reporting_snapshot())
+            return True
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("Booking sweeper tick failed.")
+            return False
+        finally:
+            db.session.remove()
+
+
+def run_sweeper_forever(interval=None):
+    """
+    blocking sweeper loop, used by the background thread and `flask run-sweeper`.
+    """
+    interval = interval or app.config['SWEEPER_INTERVAL_SECONDS']
+    while not _stop_event.is_set():
+        run_sweeper_tick()
+        _stop_event.wait(interval)
+
+
+# -----------------------------
+# BACKGROUND THREAD:
+# started once per worker on its first request (not at import time, so flask cli
+# commands do not spawn it). Every worker runs the thread, the lease decides who sweeps.
+# -----------------------------
+def start_background_sweeper():
+    global _sweeper_thread
+    if not app.config['SWEEPER_ENABLED']:
+        return
+    if _sweeper_thread is not None and _sweeper_thread.is_alive():
+        return
+
+    with _sweeper_lock:
+        if _sweeper_thread is not None and _sweeper_thread.is_alive():
+            return
+        _stop_event.clear()
+        _sweeper_thread = threading.Thread(target=run_sweeper_forever, name='booking-sweeper', daemon=True)
+        _sweeper_thread.start()
+
+
+def stop_background_sweeper():
+    _stop_event.set()
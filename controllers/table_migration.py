@@ -0,0 +1,82 @@
+# table_migration.py
+# `flask migrate-tables`: rebuilds the tables whose foreign keys or AUTOINCREMENT
+# differ from the declared ones (models/dbmodel.py find_stale_tables), since
+# SQLite cannot alter either. Starting workers only warn about such tables, the
+# rebuild is run once, explicitly, by whoever upgrades the database.
+from datetime import datetime
+from sqlalchemy import select, delete, or_, text
+from sqlalchemy.schema import CreateTable
+from models.dbmodel import db, User, UserBookings, ParkingLot, ParkingSpot, LotDailyRollup, UserLotRollup, \
+    CHANGE_ENTITIES, find_stale_tables, ensure_indexes, ensure_lot_search_index, refresh_lot_counters, \
+    refresh_unread_counters, bump_versions
+from .sweeper import release_bookings
+
+
+def migrate_tables():
+    """
+    rebuilds the stale tables in one transaction, with foreign keys off as SQLite
+    documents it (create the new table, copy, drop, rename, check the keys, commit).
+    Rows left behind while foreign keys were not enforced are then fixed: bookings
+    without their spot or user go through the release-to-history path (their spots
+    and counters follow), SET NULL columns are cleared, other orphans deleted.
+    Returns (names of the tables rebuilt, orphaned bookings released).
+    """
+    stale = [db.metadata.tables[name] for name in find_stale_tables()]
+    if not stale:
+        return [], 0
+
+    connection = db.session.connection()
+    dbapi_connection = connection.connection.dbapi_connection
+    connection.exec_driver_sql('PRAGMA foreign_keys=OFF') # no-op inside a transaction, so first
+    try:
+        connection.exec_driver_sql('BEGIN')
+        for table in stale:
+            new_table = table.to_metadata(db.metadata, name=f'{table.name}__rebuild')
+            try:
+                connection.execute(CreateTable(new_table))
+            finally:
+                db.metadata.remove(new_table)
+            columns = ', '.join(f'"{column.name}"' for column in table.columns)
+            connection.exec_driver_sql(f'INSERT INTO "{new_table.name}" ({columns}) SELECT {columns} FROM "{table.name}"')
+            connection.exec_driver_sql(f'DROP TABLE "{table.name}"')
+            connection.exec_driver_sql(f'ALTER TABLE "{new_table.name}" RENAME TO "{table.name}"')
+
+        released = release_bookings(datetime.now(), or_(
+            UserBookings.spot_id.not_in(select(ParkingSpot.spot_id)),
+            UserBookings.user_id.not_in(select(User.user_id))
+        ))
+
+        for table in db.metadata.sorted_tables: # parents first, so their orphans go before their children
+            for constraint in table.foreign_key_constraints:
+                if len(constraint.elements) != 1:
+                    continue
+                element = constraint.elements[0]
+                orphan = (f'"{element.parent.name}" IS NOT NULL AND "{element.parent.name}" NOT IN '
+                          f'(SELECT "{element.column.name}" FROM "{element.column.table.name}")')
+                if (constraint.ondelete or '').upper() == 'SET NULL':
+                    connection.exec_driver_sql(f'UPDATE "{table.name}" SET "{element.parent.name}" = NULL WHERE {orphan}')
+                else:
+                    connection.exec_driver_sql(f'DELETE FROM "{table.name}" WHERE {orphan}')
+        # the rollups are not foreign keyed, drop those of users and lots that are gone
+        db.session.execute(delete(UserLotRollup).where(UserLotRollup.user_id.not_in(select(User.user_id))))
+        db.session.execute(delete(LotDailyRollup).where(LotDailyRollup.lot_id.not_in(select(ParkingLot.lot_id))))
+
+        refresh_lot_counters()
+        refresh_unread_counters()
+        bump_versions(*CHANGE_ENTITIES)
+
+        violations = connection.exec_driver_sql('PRAGMA foreign_key_check').all()
+        if violations:
+            raise RuntimeError(f"foreign key violations left after rebuilding {[t.name for t in stale]}: {violations[:10]}")
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        # the same pooled connection, the session has handed it back by now
+        dbapi_connection.execute('PRAGMA foreign_keys=ON')
+
+    # indexes and lot search triggers were dropped with the old tables
+    ensure_indexes()
+    ensure_lot_search_index()
+    return [table.name for table in stale], released
@@ -0,0 +1,61 @@
+# user_cache.py
+# the logged in user of a request, loaded once (only the columns pages use) and
+# kept on flask.g. A short-TTL per-worker cache saves the query on repeat
+# navigation; profile writes invalidate it, other workers drop it through
+# the 'users' change version.
+from flask import g
+from sqlalchemy.orm import load_only
+from app import app
+from models.dbmodel import db, User
+from .cache import get_cache
+from .change_versions import on_change
+
+
+# columns every user page needs, anything else (pass_wd) loads on access
+USER_PAGE_COLUMNS = (User.user_id, User.user_name, User.email_id, User.is_admin)
+
+
+def _user_cache():
+    return get_cache('users',
+                     maxsize=app.config['USER_CACHE_MAX_ENTRIES'],
+                     ttl=app.config['USER_CACHE_TTL_SECONDS'])
+
+
+def _load_detached_user(user_id):
+    user = db.session.query(User).options(load_only(*USER_PAGE_COLUMNS)).filter_by(user_id=user_id).first()
+    if user is not None:
+        db.session.expunge(user)
+    return user
+
+
+def get_request_user(user_id):
+    """
+    the user with this id for the current request (None if there is none),
+    loaded at most once per request and stored on g.user.
+    """
+    user = g.get('user')
+    if user is not None and user.user_id == user_id:
+        return user
+
+    use_cache = app.config['USER_CACHE_TTL_SECONDS'] > 0
+    cached_user = _user_cache().get(user_id) if use_cache else None
+    if cached_user is None:
+        cached_user = _load_detached_user(user_id)
+        if cached_user is None:
+            return None # not cached, a user registered later must not be hidden
+        if use_cache:
+            _user_cache().set(user_id, cached_user)
+
+    # the cached copy stays detached, the request works on its own merged instance
+    g.user = db.session.merge(cached_user, load=False)
+    return g.user
+
+
+def invalidate_user(user_id):
+    """called after the user is updated or deleted (commit first)"""
+    _user_cache().invalidate(user_id)
+    g.pop('user', None)
+
+
+# users changed in another worker
+on_change('users', lambda: _user_cache().clear())
@@ -0,0 +1,110 @@
+# user_purge.py
+# deleting user accounts with set-based statements: the account deletion of
+# the profile page and the purge of users inactive for USER_INACTIVE_MONTHS.
+# The database cascades a deleted user to its history and notifications
+# (foreign keys are enforced), users with bookings are never deleted. The
+# purge runs in batches of USER_PURGE_BATCH_SIZE users, one short transaction
+# each. Nothing but the cutoff is kept between batches, so an interrupted
+# purge resumes by simply running it again.
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, func
+from app import app
+from models.dbmodel import db, User, UserBookings, bump_versions
+from .rollups import delete_user_rollups
+from .user_cache import invalidate_user
+
+
+# per-worker time of the last last_active_at write of each user
+_last_touched = {}
+
+
+def note_user_activity(user_id):
+    """
+    records that the user is active, written at most once per
+    USER_ACTIVITY_TOUCH_SECONDS per user and worker. Written on its own connection
+    and transaction: committing the request session would expire the request user.
+    """
+    now = datetime.now()
+    touched_at = _last_touched.get(user_id)
+    if touched_at is not None and now - touched_at < timedelta(seconds=app.config['USER_ACTIVITY_TOUCH_SECONDS']):
+        return
+    with db.engine.begin() as conn:
+        conn.execute(update(User).where(User.user_id == user_id).values(last_active_at=now))
+    _last_touched[user_id] = now
+
+
+def inactive_cutoff(months=None, now=None):
+    """users not active since this time are purged"""
+    months = app.config['USER_INACTIVE_MONTHS'] if months is None else months
+    return (now or datetime.now()) - timedelta(days=30 * months)
+
+
+def _is_purgeable(cutoff):
+    has_booking = select(UserBookings.id).where(UserBookings.user_id == User.user_id).exists()
+    return (User.is_admin == False, User.last_active_at < cutoff, ~has_booking)
+
+
+def delete_users(*criteria):
+    """
+    deletes the users matching criteria that have no bookings left, in the
+    current transaction: one DELETE (cascading to history and notifications),
+    and their rollups. Returns the ids of the users deleted.
+    """
+    has_booking = select(UserBookings.id).where(UserBookings.user_id == User.user_id).exists()
+    deleted_ids = db.session.scalars(
+        delete(User).where(~has_booking, *criteria).returning(User.user_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if deleted_ids:
+        delete_user_rollups(deleted_ids)
+        bump_versions('users')
+    return deleted_ids
+
+
+def purge_batch_select(cutoff, batch_size):
+    """
+    ids of the next batch of users to purge, longest inactive first: read in
+    ix_user_last_active_at order (ordering by user_id makes SQLite walk the whole table).
+    """
+    return (
+        select(User.user_id).where(*_is_purgeable(cutoff))
+        .order_by(User.last_active_at, User.user_id).limit(batch_size)
+    )
+
+
+def count_inactive_users(cutoff):
+    return db.session.scalar(select(func.count(User.user_id)).where(*_is_purgeable(cutoff)))
+
+
+def purge_inactive_users_batch(cutoff, batch_size=None):
+    """deletes (and commits) the next batch of inactive users, returns how many were deleted"""
+    batch_size = batch_size or app.config['USER_PURGE_BATCH_SIZE']
+    batch = purge_batch_select(cutoff, batch_size)
+    # the conditions are checked again by the DELETE, a user active meanwhile is kept
+    deleted_ids = delete_users(User.user_id.in_(batch), *_is_purgeable(cutoff))
+    db.session.commit()
+    for user_id in deleted_ids:
+        invalidate_user(user_id)
+        _last_touched.pop(user_id, None)
+    return len(deleted_ids)
+
+
+def purge_inactive_users(months=None, batch_size=None, pause=0.05, on_batch=None):
+    """
+    deletes all users inactive for months, batch by batch, sleeping pause
+    seconds between batches so other writers get the database. on_batch is
+    called with (deleted so far, total) after each batch. Returns the count.
+    """
+    cutoff = inactive_cutoff(months)
+    total = count_inactive_users(cutoff)
+    purged = 0
+    while True:
+        deleted = purge_inactive_users_batch(cutoff, batch_size)
+        if not deleted:
+            break
+        purged += deleted
+        if on_batch:
+            on_batch(purged, total)
+        time.sleep(pause)
+    return purged
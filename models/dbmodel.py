@@ -1,12 +1,25 @@
 from app import app
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import CheckConstraint
+from sqlalchemy import CheckConstraint, inspect, select, update, func, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 from werkzeug.security import generate_password_hash
 from datetime import datetime 
 import os
+import sqlite3
+import sys
 
 db = SQLAlchemy(app)
 
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite only enforces foreign keys (and their ON DELETE) when asked to, per connection"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
 class User(db.Model):
     __tablename__ = 'user'
 
@@ -15,11 +28,18 @@ class User(db.Model):
     pass_wd = db.Column(db.String(100), nullable=False)
     user_name = db.Column(db.String(50), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0, server_default='0') # unread UserNotification rows
+    last_active_at = db.Column(db.DateTime, default=datetime.now) # login or user page visit, see controllers/user_purge.py
 
     bookings = db.relationship('UserBookings', backref='user', cascade="all, delete-orphan", passive_deletes=True)
     history = db.relationship('UserHistory', backref='user', cascade="all, delete-orphan", passive_deletes=True)
     notifications = db.relationship('UserNotification', backref='user', cascade="all, delete-orphan", passive_deletes=True)
 
+    __table_args__ = (
+        db.Index('ix_user_last_active_at', 'last_active_at'), # inactive user purge
+        {'sqlite_autoincrement': True}, # ids of deleted users are never handed out again
+    )
+
 
 class UserBookings(db.Model):
     __tablename__ = 'user_bookings'
@@ -34,6 +54,12 @@ class UserBookings(db.Model):
 
     spot = db.relationship('ParkingSpot', back_populates='bookings')
 
+    __table_args__ = (
+        db.Index('ix_user_bookings_spot_window', 'spot_id', 'parking_time', 'leaving_time'), # overlap checks per spot
+        db.Index('ix_user_bookings_leaving_time', 'leaving_time'), # expiry scan, live bookings
+        db.Index('ix_user_bookings_user_id', 'user_id'), # users current bookings
+    )
+
 
 class UserHistory(db.Model):
     __tablename__ = 'booking_history'
@@ -48,6 +74,12 @@ class UserHistory(db.Model):
 
     spot_obj = db.relationship('ParkingSpot', back_populates='history_records')
 
+    __table_args__ = (
+        db.Index('ix_booking_history_user_id', 'user_id', 'id'), # users history, newest first
+        db.Index('ix_booking_history_spot_id', 'spot_id'), # ON DELETE SET NULL when spots are deleted
+        {'sqlite_autoincrement': True}, # ids of archived rows are never handed out again
+    )
+
 
 class ParkingLot(db.Model):
     __tablename__ = 'parkinglot'
@@ -60,10 +92,20 @@ class ParkingLot(db.Model):
     address = db.Column(db.String(200), unique=True, nullable=False)
     pincode = db.Column(db.String(6), nullable=False)
 
-    spots = db.relationship('ParkingSpot', backref='lot', cascade="all, delete-orphan", passive_deletes=False)
+    # denormalized counters, kept in the same transaction as the spot/booking writes
+    # (see adjust_lot_counters / refresh_lot_counters below)
+    total_spots = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    occupied_spots = db.Column(db.Integer, nullable=False, default=0, server_default='0') # spots with status 'O'
+    booked_spots = db.Column(db.Integer, nullable=False, default=0, server_default='0') # bookings not yet moved to history
+
+    # spots (and through them their bookings) are deleted by the database, ON DELETE CASCADE
+    spots = db.relationship('ParkingSpot', backref='lot', cascade="all, delete-orphan", passive_deletes=True)
 
     __table_args__ = (
         db.CheckConstraint("area_type IN ('Open','Covered','Both')", name='check_area_type'),
+        db.Index('ix_parkinglot_city_pincode', 'city', 'pincode'), # search by city (and pincode)
+        db.Index('ix_parkinglot_pincode', 'pincode'), # search by pincode only
+        {'sqlite_autoincrement': True}, # a new lot never takes over the id (and rollups) of a deleted one
     )
 
 
@@ -71,7 +113,7 @@ class ParkingSpot(db.Model):
     __tablename__ = 'parking_spot'
 
     spot_id = db.Column(db.Integer, primary_key=True, autoincrement=True, unique=True, nullable=False)
-    lot_id = db.Column(db.Integer, db.ForeignKey("parkinglot.lot_id"), nullable=False)
+    lot_id = db.Column(db.Integer, db.ForeignKey("parkinglot.lot_id", ondelete="CASCADE"), nullable=False)
     status = db.Column(db.String(1), nullable=False) # O-occupied, A-available
 
     bookings = db.relationship('UserBookings', back_populates='spot', passive_deletes=True)
@@ -79,6 +121,7 @@ class ParkingSpot(db.Model):
 
     __table_args__ = (
         CheckConstraint("status IN ('O','A')", name='check_status_occupied'),
+        db.Index('ix_parking_spot_lot_status', 'lot_id', 'status'), # spots of a lot, occupied counts
     )
 
 
@@ -91,10 +134,271 @@ class UserNotification(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
     is_read = db.Column(db.Boolean, default=False, nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_user_notifications_unread', 'user_id', 'is_read', 'created_at'), # unread lookup in order
+    )
+
     def __repr__(self):
         return f"<UserNotification {self.id} User:{self.user_id} Category:{self.message_category} Read:{self.is_read}>"
 
 
+class SweeperLease(db.Model):
+    __tablename__ = 'sweeper_lease'
+
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=False) # host:pid:token of the worker running the sweeper
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+# pre-aggregated booking history for the summary pages, updated when bookings
+# move to history (controllers/rollups.py). Not foreign keyed: the rollups of a
+# lot are deleted together with the lot (delete_lot_rollups).
+class LotDailyRollup(db.Model):
+    __tablename__ = 'lot_daily_rollup'
+
+    lot_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True) # date of booking_time
+    booking_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+
+class UserLotRollup(db.Model):
+    __tablename__ = 'user_lot_rollup'
+
+    user_id = db.Column(db.Integer, primary_key=True)
+    lot_id = db.Column(db.Integer, primary_key=True)
+    booking_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+
+class HistoryArchiveMonth(db.Model):
+    __tablename__ = 'history_archive_months'
+
+    month = db.Column(db.String(7), primary_key=True) # 'YYYY-MM' of booking_time, one archive file each
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+
+# entity classes whose writes are announced to other workers through change_versions
+CHANGE_ENTITIES = ('lots', 'spots', 'bookings', 'users', 'notifications')
+
+
+class ChangeVersion(db.Model):
+    __tablename__ = 'change_versions'
+
+    entity = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0) # bumped by every write to the entity
+
+
+def bump_versions(*entities):
+    """
+    increments the change version of each entity in the current transaction, so
+    other workers see the bump exactly when the write itself commits.
+    """
+    for entity in entities:
+        result = db.session.execute(
+            update(ChangeVersion)
+            .where(ChangeVersion.entity == entity)
+            .values(version=ChangeVersion.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0: # entity without a row yet
+            db.session.add(ChangeVersion(entity=entity, version=1))
+            db.session.flush()
+
+
+def ensure_change_versions():
+    """inserts the missing change_versions rows, starting at 0"""
+    existing = {row.entity for row in db.session.query(ChangeVersion.entity)}
+    for entity in CHANGE_ENTITIES:
+        if entity not in existing:
+            db.session.add(ChangeVersion(entity=entity, version=0))
+    db.session.commit()
+
+
+# full-text index over the searchable lot columns, an FTS5 external content table
+# (the text itself stays in parkinglot). Triggers keep it in sync with every write
+# to parkinglot, ORM or bulk. Prefix indexes make "conn*" style lookups cheap.
+LOT_SEARCH_TABLE = 'parkinglot_fts'
+LOT_SEARCH_COLUMNS = ('city', 'primelocation_name', 'address', 'pincode')
+
+_lot_search_columns = ', '.join(LOT_SEARCH_COLUMNS)
+_new_lot_values = ', '.join(f'new.{column}' for column in LOT_SEARCH_COLUMNS)
+_old_lot_values = ', '.join(f'old.{column}' for column in LOT_SEARCH_COLUMNS)
+LOT_SEARCH_DDL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {LOT_SEARCH_TABLE} USING fts5(
+    {_lot_search_columns}, content='parkinglot', content_rowid='lot_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5'
+)"""
+LOT_SEARCH_TRIGGERS = {
+    'parkinglot_fts_ai': f"""
+CREATE TRIGGER parkinglot_fts_ai AFTER INSERT ON parkinglot BEGIN
+    INSERT INTO {LOT_SEARCH_TABLE}(rowid, {_lot_search_columns}) VALUES (new.lot_id, {_new_lot_values});
+END""",
+    'parkinglot_fts_ad': f"""
+CREATE TRIGGER parkinglot_fts_ad AFTER DELETE ON parkinglot BEGIN
+    INSERT INTO {LOT_SEARCH_TABLE}({LOT_SEARCH_TABLE}, rowid, {_lot_search_columns}) VALUES ('delete', old.lot_id, {_old_lot_values});
+END""",
+    'parkinglot_fts_au': f"""
+CREATE TRIGGER parkinglot_fts_au AFTER UPDATE OF {_lot_search_columns} ON parkinglot BEGIN
+    INSERT INTO {LOT_SEARCH_TABLE}({LOT_SEARCH_TABLE}, rowid, {_lot_search_columns}) VALUES ('delete', old.lot_id, {_old_lot_values});
+    INSERT INTO {LOT_SEARCH_TABLE}(rowid, {_lot_search_columns}) VALUES (new.lot_id, {_new_lot_values});
+END""",
+}
+
+
+def ensure_lot_search_index():
+    """
+    creates the lot full-text table and its sync triggers when missing and
+    (re)builds the index from parkinglot whenever a trigger had to be created,
+    e.g. on a new install or after parkinglot was rebuilt. Returns False if
+    this SQLite has no FTS5, lot search then falls back to LIKE.
+    """
+    try:
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(LOT_SEARCH_DDL)
+            existing = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+            missing = [name for name in LOT_SEARCH_TRIGGERS if name not in existing]
+            for name in missing:
+                conn.exec_driver_sql(LOT_SEARCH_TRIGGERS[name])
+            if missing:
+                conn.exec_driver_sql(f"INSERT INTO {LOT_SEARCH_TABLE}({LOT_SEARCH_TABLE}) VALUES ('rebuild')")
+                print(f"Built the lot search index ({LOT_SEARCH_TABLE}).", file=sys.stderr)
+    except OperationalError as error: # no fts5 module
+        app.logger.warning("Lot full-text search unavailable, using LIKE search: %s", error)
+        return False
+    return True
+
+
+def adjust_lot_counters(lot_id, total=0, occupied=0, booked=0):
+    """
+    shifts the counters of one lot in the current transaction. Done in SQL
+    (col = col + n) so concurrent writers do not overwrite each other.
+    """
+    db.session.execute(
+        update(ParkingLot)
+        .where(ParkingLot.lot_id == lot_id)
+        .values(
+            total_spots=ParkingLot.total_spots + total,
+            occupied_spots=ParkingLot.occupied_spots + occupied,
+            booked_spots=ParkingLot.booked_spots + booked
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def refresh_lot_counters(lot_ids=None):
+    """
+    recomputes the counters of the given lots (all lots if None) from the spot and
+    booking tables with one correlated UPDATE, in the current transaction.
+    """
+    stmt = update(ParkingLot).values(
+        total_spots=select(func.count(ParkingSpot.spot_id))
+            .where(ParkingSpot.lot_id == ParkingLot.lot_id).scalar_subquery(),
+        occupied_spots=select(func.count(ParkingSpot.spot_id))
+            .where(ParkingSpot.lot_id == ParkingLot.lot_id, ParkingSpot.status == 'O').scalar_subquery(),
+        booked_spots=select(func.count(UserBookings.id))
+            .join(ParkingSpot, ParkingSpot.spot_id == UserBookings.spot_id)
+            .where(ParkingSpot.lot_id == ParkingLot.lot_id).scalar_subquery()
+    )
+    if lot_ids is not None:
+        stmt = stmt.where(ParkingLot.lot_id.in_(list(lot_ids)))
+    db.session.execute(stmt.execution_options(synchronize_session=False))
+
+
+def refresh_unread_counters(user_ids=None):
+    """
+    recomputes User.unread_notifications of the given users (a list or a select of
+    user ids, all users if None) with one correlated UPDATE, in the current transaction.
+    """
+    stmt = update(User).values(
+        unread_notifications=select(func.count(UserNotification.id))
+            .where(UserNotification.user_id == User.user_id, UserNotification.is_read == False)
+            .scalar_subquery()
+    )
+    if user_ids is not None:
+        stmt = stmt.where(User.user_id.in_(user_ids))
+    db.session.execute(stmt.execution_options(synchronize_session=False))
+
+
+def ensure_columns():
+    """
+    adds declared columns that are missing from existing tables, since
+    db.create_all() never alters a table. New columns need a server_default
+    (or must be nullable). Returns the 'table.column' names added.
+    """
+    inspector = inspect(db.engine)
+    added = []
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(dialect=db.engine.dialect)}'
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    default = default.text if hasattr(default, 'text') else "'" + str(default).replace("'", "''") + "'"
+                    ddl += f" DEFAULT {default}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.exec_driver_sql(ddl)
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def _declared_foreign_keys(table):
+    return {(tuple(fk.parent.name for fk in constraint.elements), constraint.referred_table.name, (constraint.ondelete or '').upper())
+            for constraint in table.foreign_key_constraints}
+
+
+def _declares_autoincrement(table):
+    return bool(table.kwargs.get('sqlite_autoincrement'))
+
+
+def find_stale_tables():
+    """
+    names of the existing tables whose foreign keys (e.g. a missing ON DELETE)
+    or AUTOINCREMENT differ from the declared ones. SQLite cannot alter either,
+    the tables are rebuilt by `flask migrate-tables` (controllers/table_migration.py).
+    """
+    inspector = inspect(db.engine)
+    with db.engine.connect() as conn:
+        autoincrement_tables = {row[0] for row in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE '%AUTOINCREMENT%'"
+        )}
+    stale = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        reflected = {(tuple(fk['constrained_columns']), fk['referred_table'], (fk['options'].get('ondelete') or '').upper())
+                     for fk in inspector.get_foreign_keys(table.name)}
+        if (reflected != _declared_foreign_keys(table)
+                or _declares_autoincrement(table) != (table.name in autoincrement_tables)):
+            stale.append(table.name)
+    return stale
+
+
+def ensure_indexes():
+    """
+    creates declared indexes that are missing from an existing database.
+    db.create_all() only creates indexes together with a new table.
+    Returns the names of the indexes created.
+    """
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                created.append(index.name)
+    return created
+
+
+# startup messages go to stderr, stdout stays clean for CLI output such as `flask export`
 with app.app_context():
     db_uri = app.config.get('SQLALCHEMY_DATABASE_URI')            #get dbfile configured path in app config like 'sqlite///filename'
     db_filename = db_uri.replace('sqlite:///', '')
@@ -102,7 +406,36 @@ with app.app_context():
     db_file_path = os.path.join(app.instance_path, db_filename)   #join with file name with root folder/instance/filename
     db_existed_bef_create_all = os.path.exists(db_file_path)      #check if a files exists in that path 
     #print(f"DEBUG: checking for DB file at: {db_file_path}")     #to debug, showed correct behaviour therefore commented
-    db.create_all()
+    db.create_all(bind_key=None) # the reporting bind (if configured) is a read-only snapshot
+    added_columns = ensure_columns()
+    for column_name in added_columns:
+        print(f"Added missing column {column_name}.", file=sys.stderr)
+    if any(name.startswith('parkinglot.') for name in added_columns):
+        refresh_lot_counters() # backfill the lot counters of an existing database
+        db.session.commit()
+    if 'user.unread_notifications' in added_columns:
+        refresh_unread_counters()
+        db.session.commit()
+    if 'user.last_active_at' in added_columns:
+        # no activity was recorded before, so existing users count as active from now on
+        db.session.execute(update(User).where(User.last_active_at.is_(None)).values(last_active_at=datetime.now()))
+        db.session.commit()
+    stale_tables = find_stale_tables()
+    if stale_tables:
+        # rebuilding is a migration, never done implicitly by a starting worker
+        print(f"Tables {', '.join(stale_tables)} differ from their declared foreign keys or AUTOINCREMENT: "
+              "back up the database and run `flask migrate-tables`.", file=sys.stderr)
+    for index_name in ensure_indexes():
+        print(f"Created missing index {index_name}.", file=sys.stderr)
+    ensure_change_versions()
+    ensure_lot_search_index()
+    # rollups still empty on a database with history (new tables after an upgrade, or an
+    # interrupted fill): the summary pages would under-report, fill them before serving
+    if (db_existed_bef_create_all and not LotDailyRollup.query.first()
+            and (UserHistory.query.first() or HistoryArchiveMonth.query.first())):
+        from controllers.rollups import rebuild_rollups # imports this module, so only here
+        lot_day_rows, user_lot_rows = rebuild_rollups()
+        print(f"Filled the summary rollups from existing history ({lot_day_rows} lot/day, {user_lot_rows} user/lot rows).", file=sys.stderr)
 
     # -------------------- create Master User Admin (only if not exists) ----------------------
     admin_email = "parkalot@admin"
@@ -117,15 +450,15 @@ with app.app_context():
         master_admin = User(user_id=1, email_id=admin_email, pass_wd=passhash, user_name=admin_username, is_admin=True)
         db.session.add(master_admin)
         db.session.commit()
-        print(f"Master Admin user '{admin_username}' ({admin_email}) created successfully with ID 1.")
+        print(f"Master Admin user '{admin_username}' ({admin_email}) created successfully with ID 1.", file=sys.stderr)
     else:
-        print(f"Master Admin user '{admin_email}' already exists. Skipping creation.")
+        print(f"Master Admin user '{admin_email}' already exists. Skipping creation.", file=sys.stderr)
 
 
     # ---------------------- Populate dummy parking lot data, only add if new db/tables created --------------------
 
     if not db_existed_bef_create_all:
-        print("Populating dummy parking lot data...")
+        print("Populating dummy parking lot data...", file=sys.stderr)
         
         # all parkinglots data nested list of dictionaries
         dummy_parking_lots_data = [
@@ -154,7 +487,8 @@ with app.app_context():
                 primelocation_name=lot_data["primelocation_name"],
                 price_per_hr=lot_data["price_per_hr"],
                 address=lot_data["address"],
-                pincode=lot_data["pincode"])
+                pincode=lot_data["pincode"],
+                total_spots=10)
             
             db.session.add(new_lot)
             db.session.flush() # get lot_id before commit
@@ -164,6 +498,6 @@ with app.app_context():
                 db.session.add(ParkingSpot(lot_id=new_lot.lot_id, status='A'))
             
         db.session.commit()
-        print("Dummy parking lot data populated.")
+        print("Dummy parking lot data populated.", file=sys.stderr)
     else:
-        print("Parking lot data already exists. Skipping dummy data population.")
+        print("Parking lot data already exists. Skipping dummy data population.", file=sys.stderr)
@@ -0,0 +1,35 @@
+// autocomplete for the free text lot search boxes: inputs with data-suggest-url
+// get their <datalist> (list attribute) filled from the suggestion endpoint
+document.addEventListener('DOMContentLoaded', function() {
+    const DEBOUNCE_MS = 150;
+    const MIN_CHARS = 2;
+
+    document.querySelectorAll('input[data-suggest-url]').forEach(input => {
+        const datalist = document.getElementById(input.getAttribute('list'));
+        if (!datalist) return;
+        let timer = null;
+        let lastQuery = '';
+
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => {
+                const query = input.value.trim();
+                if (query.length < MIN_CHARS || query === lastQuery) return;
+                lastQuery = query;
+                fetch(input.dataset.suggestUrl + '?q=' + encodeURIComponent(query))
+                    .then(response => response.ok ? response.json() : Promise.reject(new Error('Failed to load suggestions')))
+                    .then(data => {
+                        if (data.query !== input.value.trim().slice(0, 100)) return; // a newer request is on its way
+                        datalist.innerHTML = '';
+                        data.suggestions.forEach(lot => {
+                            const option = document.createElement('option');
+                            option.value = lot.name;
+                            option.label = `${lot.city} ${lot.pincode} - ${lot.address}`;
+                            datalist.appendChild(option);
+                        });
+                    })
+                    .catch(error => console.error(error));
+            }, DEBOUNCE_MS);
+        });
+    });
+});
@@ -1,6 +1,91 @@
 document.addEventListener('DOMContentLoaded', function() {
+    const GRID_PAGE_SIZE = 200; // spots rendered at once, keeps the DOM small for very large lots
+    const STATUS_CLASSES = { 'O': 'occupied', 'F': 'future-booked', 'A': 'available' };
+
+    const spotsGrid = document.querySelector('.spots-grid');
+    const gridUrl = spotsGrid ? spotsGrid.dataset.gridUrl : null;
+    const batchDetailsUrl = spotsGrid ? spotsGrid.dataset.detailsUrl : null;
+
+    let gridSpotIds = [];   // all spot ids of the lot, in order
+    let gridStatuses = '';  // one display status char per spot
+    let gridPage = 0;
+
+    // details of the spots on the current page, prefetched in one request so panels open instantly
+    const spotDetailsCache = {};
+
+    // [[firstId, length], ...] runs of consecutive ids -> flat list of ids
+    function expandIdRuns(idRuns) {
+        const ids = [];
+        idRuns.forEach(([firstId, length]) => {
+            for (let i = 0; i < length; i++) ids.push(firstId + i);
+        });
+        return ids;
+    }
+
+    function loadGrid() {
+        if (!gridUrl) return;
+        // 'no-cache' revalidates with If-None-Match, an unchanged grid comes back as a 304
+        fetch(gridUrl, { cache: 'no-cache' })
+            .then(response => response.ok ? response.json() : Promise.reject(new Error('Failed to load spots')))
+            .then(data => {
+                gridSpotIds = expandIdRuns(data.ids);
+                gridStatuses = data.status;
+                const lastPage = Math.max(Math.ceil(gridSpotIds.length / GRID_PAGE_SIZE) - 1, 0);
+                renderGridPage(Math.min(gridPage, lastPage));
+            })
+            .catch(error => {
+                console.error('Error loading spot grid:', error);
+                spotsGrid.innerHTML = `<div class="alert alert-danger">Error: ${error.message}</div>`;
+            });
+    }
+
+    function renderGridPage(page) {
+        gridPage = page;
+        const start = page * GRID_PAGE_SIZE;
+        const pageIds = gridSpotIds.slice(start, start + GRID_PAGE_SIZE);
+
+        const fragment = document.createDocumentFragment();
+        pageIds.forEach((spotId, offset) => {
+            const spot = document.createElement('div');
+            spot.className = `spot ${STATUS_CLASSES[gridStatuses[start + offset]] || 'available'}`;
+            spot.textContent = spotId;
+            spot.addEventListener('click', () => showDetails(spotId));
+            fragment.appendChild(spot);
+        });
+        spotsGrid.replaceChildren(fragment);
+        if (!pageIds.length) {
+            spotsGrid.innerHTML = `<p class="text-center text-muted">No spots in this lot.</p>`;
+        }
+
+        // pager, only shown when the lot does not fit on one page
+        const pageCount = Math.ceil(gridSpotIds.length / GRID_PAGE_SIZE);
+        document.getElementById('spots-pager').classList.toggle('d-none', pageCount <= 1);
+        document.getElementById('spots-page-label').textContent =
+            `Spots ${start + 1}-${start + pageIds.length} of ${gridSpotIds.length}`;
+        document.getElementById('spots-prev').disabled = page === 0;
+        document.getElementById('spots-next').disabled = page >= pageCount - 1;
+
+        prefetchDetails(pageIds);
+    }
+
+    function prefetchDetails(spotIds) {
+        if (!batchDetailsUrl || !spotIds.length) return;
+        fetch(`${batchDetailsUrl}?spot_ids=${spotIds.join(',')}`, { cache: 'no-cache' })
+            .then(response => response.ok ? response.json() : null)
+            .then(data => {
+                if (data) Object.assign(spotDetailsCache, data.spots);
+            })
+            .catch(error => console.error('Error prefetching spot details:', error));
+    }
+
     function showDetails(spotId) { 
         const panel = document.getElementById("details-content");
+
+        if (spotDetailsCache[spotId]) {
+            renderDetails(spotId, spotDetailsCache[spotId]);
+            return;
+        }
+
         panel.innerHTML = `<div class="text-center py-4"><div class="spinner-border text-primary" role="status"><span class="visually-hidden">Loading...</span></div><p class="mt-2 text-muted">Loading details...</p></div>`;
 
         fetch(`/admin/spot-details/${spotId}`)
@@ -11,82 +96,117 @@ document.addEventListener('DOMContentLoaded', function() {
                 return response.json();
             })
             .then(data => {
-                let htmlContent = '';
-
-                // --- display current status and details ---
-                if (data.current_occupied && data.current_booking_details) {
-                    // scenario: spot is currently physically occupied
-                    htmlContent += `
-                        <div class="alert alert-danger mb-3 py-2"><h6 class="mb-0 text-center">Currently Occupied</h6></div>
-                        <div class="text-start small">
-                            <p class="mb-1"><strong>User:</strong> ${data.current_booking_details.user_name}</p>
-                            <p class="mb-1"><strong>Email:</strong> ${data.current_booking_details.email}</p>
-                            <p class="mb-1"><strong>Vehicle:</strong> ${data.current_booking_details.vehicle_no}</p>
-                            <p class="mb-1"><strong>Start:</strong> ${data.current_booking_details.parking_time}</p>
-                            <p class="mb-1"><strong>Expiry:</strong> ${data.current_booking_details.leaving_time}</p>
-                            <p class="mb-1"><strong>Cost:</strong> ₹${data.current_booking_details.parking_cost}</p>
-                        </div>
-                        <hr>
-                    `;
-                } else if (data.spot_status === 'O' && !data.current_occupied) {
-                    htmlContent += `<div class="alert alert-warning text-center small">Spot marked occupied, but no active booking found.</div><hr>`;
-                } else {
-                    htmlContent += `<div class="alert alert-success text-center py-2"><h6 class="mb-0">Available</h6></div>`;
-                    if (data.future_bookings_details.length > 0) {
-                        htmlContent += `<p class="text-center text-muted small mb-2">(Booked for future)</p>`;
-                    }
-                    htmlContent += `<hr>`;
-                }
+                spotDetailsCache[spotId] = data;
+                renderDetails(spotId, data);
+            })
+            .catch(error => {
+                console.error('Error fetching spot details:', error);
+                panel.innerHTML = '';
+                panel.appendChild(textCell('div', `Error: ${error.message || 'Could not load details.'}`, 'alert alert-danger'));
+            });
+    }
 
-                // --- display future bookings if available ---
-                if (data.future_bookings_details && data.future_bookings_details.length > 0) {
-                    htmlContent += `
-                        <h6 class="text-center mt-3 mb-2">Upcoming Bookings</h6>
-                        <div class="table-responsive">
-                            <table class="table table-sm table-striped table-bordered text-start" style="font-size: 0.85rem;">
-                                <thead class="table-light">
-                                    <tr>
-                                        <th>User</th>
-                                        <th>Vehicle</th>
-                                        <th>From</th>
-                                        <th>Until</th>
-                                    </tr>
-                                </thead>
-                                <tbody>
-                                    ${data.future_bookings_details.map(fb => `
-                                        <tr>
-                                            <td>${fb.user_name}</td>
-                                            <td>${fb.vehicle_no}</td>
-                                            <td>${fb.parking_time.split(' ')[0]}<br><small>${fb.parking_time.split(' ')[1]}</small></td>
-                                            <td>${fb.leaving_time.split(' ')[0]}<br><small>${fb.leaving_time.split(' ')[1]}</small></td>
-                                        </tr>
-                                    `).join('')}
-                                </tbody>
-                            </table>
-                        </div>
-                    `;
-                } else if (!data.current_occupied) {
-                    htmlContent += `<p class="text-center text-muted small">No upcoming bookings.</p>`;
-                }
+    // user supplied values (names, vehicle numbers) only ever go into textContent
+    function textCell(tagName, text, className) {
+        const cell = document.createElement(tagName);
+        if (className) cell.className = className;
+        cell.textContent = text;
+        return cell;
+    }
 
-                // --- add delete button ---
-                htmlContent += `<div class="d-grid gap-2 mt-3">`;
-                
-                if (data.is_deletable) { 
-                    htmlContent += `<button class="btn btn-danger btn-sm" onclick="deleteSpot(${spotId})">Delete Spot</button>`;
-                } else {
-                    htmlContent += `<div class="text-center text-muted small fst-italic mb-2">Cannot delete (Active/Future bookings)</div>`;
-                }
-                
-                htmlContent += `<button class="btn btn-secondary btn-sm" onclick="clearDetails()">Close</button></div>`;
+    function dateTimeCell(value) {
+        const [day, time] = value.split(' ');
+        const cell = textCell('td', day);
+        cell.appendChild(document.createElement('br'));
+        cell.appendChild(textCell('small', time));
+        return cell;
+    }
 
-                panel.innerHTML = htmlContent;
+    function renderDetails(spotId, data) {
+        const panel = document.getElementById("details-content");
+        let htmlContent = '';
+        const booking = data.current_occupied && data.current_booking_details;
+        const futureBookings = data.future_bookings_details || [];
 
-            })
-            .catch(error => {
-                console.error('Error fetching spot details:', error);
-                panel.innerHTML = `<div class="alert alert-danger">Error: ${error.message || 'Could not load details.'}</div>`;
+        // --- display current status and details ---
+        if (booking) {
+            // scenario: spot is currently physically occupied
+            htmlContent += `
+                <div class="alert alert-danger mb-3 py-2"><h6 class="mb-0 text-center">Currently Occupied</h6></div>
+                <div class="text-start small" id="current-booking-details"></div>
+                <hr>
+            `;
+        } else if (data.spot_status === 'O' && !data.current_occupied) {
+            htmlContent += `<div class="alert alert-warning text-center small">Spot marked occupied, but no active booking found.</div><hr>`;
+        } else {
+            htmlContent += `<div class="alert alert-success text-center py-2"><h6 class="mb-0">Available</h6></div>`;
+            if (futureBookings.length > 0) {
+                htmlContent += `<p class="text-center text-muted small mb-2">(Booked for future)</p>`;
+            }
+            htmlContent += `<hr>`;
+        }
+
+        // --- display future bookings if available ---
+        if (futureBookings.length > 0) {
+            htmlContent += `
+                <h6 class="text-center mt-3 mb-2">Upcoming Bookings</h6>
+                <div class="table-responsive">
+                    <table class="table table-sm table-striped table-bordered text-start" style="font-size: 0.85rem;">
+                        <thead class="table-light">
+                            <tr>
+                                <th>User</th>
+                                <th>Vehicle</th>
+                                <th>From</th>
+                                <th>Until</th>
+                            </tr>
+                        </thead>
+                        <tbody id="future-bookings-body"></tbody>
+                    </table>
+                </div>
+            `;
+        } else if (!data.current_occupied) {
+            htmlContent += `<p class="text-center text-muted small">No upcoming bookings.</p>`;
+        }
+
+        // --- add delete button ---
+        htmlContent += `<div class="d-grid gap-2 mt-3">`;
+        
+        if (data.is_deletable) { 
+            htmlContent += `<button class="btn btn-danger btn-sm" onclick="deleteSpot(${spotId})">Delete Spot</button>`;
+        } else {
+            htmlContent += `<div class="text-center text-muted small fst-italic mb-2">Cannot delete (Active/Future bookings)</div>`;
+        }
+        
+        htmlContent += `<button class="btn btn-secondary btn-sm" onclick="clearDetails()">Close</button></div>`;
+
+        panel.innerHTML = htmlContent;
+
+        // --- fill in the booking values ---
+        if (booking) {
+            const details = document.getElementById("current-booking-details");
+            [
+                ['User', booking.user_name],
+                ['Email', booking.email],
+                ['Vehicle', booking.vehicle_no],
+                ['Start', booking.parking_time],
+                ['Expiry', booking.leaving_time],
+                ['Cost', `₹${booking.parking_cost}`]
+            ].forEach(([label, value]) => {
+                const line = textCell('p', ` ${value}`, 'mb-1');
+                line.prepend(textCell('strong', `${label}:`));
+                details.appendChild(line);
             });
+        }
+
+        const tbody = document.getElementById("future-bookings-body");
+        futureBookings.forEach(fb => {
+            const row = document.createElement('tr');
+            row.appendChild(textCell('td', fb.user_name));
+            row.appendChild(textCell('td', fb.vehicle_no));
+            row.appendChild(dateTimeCell(fb.parking_time));
+            row.appendChild(dateTimeCell(fb.leaving_time));
+            tbody.appendChild(row);
+        });
     }
 
     function clearDetails() {
@@ -114,6 +234,13 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    if (spotsGrid) {
+        document.getElementById('spots-prev').addEventListener('click', () => renderGridPage(gridPage - 1));
+        document.getElementById('spots-next').addEventListener('click', () => renderGridPage(gridPage + 1));
+        loadGrid();
+        setInterval(loadGrid, 30000); // keep grid and details fresh, cheap (304) while nothing changes
+    }
+
     window.showDetails = showDetails;
     window.clearDetails = clearDetails;
     window.deleteSpot = deleteSpot;
@@ -0,0 +1,13 @@
+# the app configures itself from the environment when it is first imported,
+# point it at a scratch database (created with the dummy data) before that
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch_dir = tempfile.mkdtemp(prefix='parkalot-tests-')
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(_scratch_dir, 'parkalot.db')
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ['SWEEPER_ENABLED'] = 'False'
+os.environ['HISTORY_ARCHIVE_DIR'] = os.path.join(_scratch_dir, 'history_archive')
@@ -0,0 +1,52 @@
+# User.unread_notifications follows the notifications the sweeper writes and the flash that reads them
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, delete
+from app import app
+from models.dbmodel import db, User, ParkingLot, ParkingSpot, UserBookings, UserNotification
+from controllers import sweeper
+from controllers.notifications import flash_unread_user_notifications
+
+
+def unread_of(user_id):
+    counter = db.session.scalar(select(User.unread_notifications).where(User.user_id == user_id))
+    rows = db.session.scalar(select(func.count(UserNotification.id))
+                             .where(UserNotification.user_id == user_id, UserNotification.is_read == False))
+    return counter, rows
+
+
+def test_sweep_adds_to_the_counter_and_flash_resets_it(monkeypatch):
+    monkeypatch.setattr(sweeper, '_next_event_at', None)
+    with app.app_context():
+        user = User(email_id='unread@test', pass_wd='x', user_name='Unread')
+        lot = ParkingLot(area_type='Open', city='Unread', primelocation_name='Unread Test', price_per_hr=1.0,
+                         address='unread counter test', pincode='000002')
+        db.session.add_all([user, lot])
+        db.session.flush()
+        spots = [ParkingSpot(lot_id=lot.lot_id, status='A') for _ in range(3)]
+        db.session.add_all(spots)
+        db.session.flush()
+        now = datetime.now()
+        db.session.add_all([
+            # two expire (one notification), two activate (one each)
+            UserBookings(user_id=user.user_id, spot_id=spots[0].spot_id, parking_time=now - timedelta(hours=3),
+                         leaving_time=now - timedelta(hours=2), parking_cost=1, vehicle_no='EXP1'),
+            UserBookings(user_id=user.user_id, spot_id=spots[0].spot_id, parking_time=now - timedelta(hours=2),
+                         leaving_time=now - timedelta(hours=1), parking_cost=1, vehicle_no='EXP2'),
+            UserBookings(user_id=user.user_id, spot_id=spots[1].spot_id, parking_time=now - timedelta(minutes=5),
+                         leaving_time=now + timedelta(hours=1), parking_cost=1, vehicle_no='ACT1'),
+            UserBookings(user_id=user.user_id, spot_id=spots[2].spot_id, parking_time=now - timedelta(minutes=5),
+                         leaving_time=now + timedelta(hours=1), parking_cost=1, vehicle_no='ACT2'),
+        ])
+        db.session.commit()
+        user_id, lot_id = user.user_id, lot.lot_id
+        try:
+            sweeper.update_spot_statuses_and_counts()
+            assert unread_of(user_id) == (3, 3)
+
+            with app.test_request_context():
+                flash_unread_user_notifications(user_id)
+            assert unread_of(user_id) == (0, 0)
+        finally:
+            db.session.execute(delete(User).where(User.user_id == user_id))
+            db.session.execute(delete(ParkingLot).where(ParkingLot.lot_id == lot_id))
+            db.session.commit()
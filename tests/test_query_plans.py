@@ -0,0 +1,42 @@
+# EXPLAIN QUERY PLAN of the statements the app really runs on its hot paths
+# (controllers/query_plans.py, shared with `flask explain-indexes`), against
+# the scratch database, so a query or index change that loses the index path fails here.
+from datetime import datetime
+import pytest
+from app import app
+from models.dbmodel import db
+from controllers.query_plans import HOT_STATEMENTS, check_hot_query_plans, explain_query_plan
+from controllers.history import history_page_select
+
+
+NOW = datetime(2026, 1, 1, 12)
+
+
+@pytest.fixture(scope='module')
+def plans():
+    with app.app_context():
+        return {label: (plan, problems) for label, plan, problems in check_hot_query_plans(NOW)}
+
+
+@pytest.mark.parametrize('label', [label for label, _, _ in HOT_STATEMENTS])
+def test_hot_statement_uses_its_indexes(plans, label):
+    plan, problems = plans[label]
+    assert not problems, f"{label}: {problems} in {plan}"
+
+
+def test_every_declared_index_has_a_hot_statement():
+    checked = {index_name for _, _, index_names in HOT_STATEMENTS for index_name in index_names}
+    declared = {index.name for table in db.metadata.sorted_tables for index in table.indexes}
+    assert declared <= checked, f"indexes no hot statement shows in use: {sorted(declared - checked)}"
+
+
+def test_history_page_needs_no_sort():
+    with app.app_context(), db.engine.connect() as conn:
+        plan = explain_query_plan(history_page_select(1, before_id=1000), conn)
+    assert not [step for step in plan if 'TEMP B-TREE' in step], plan
+
+
+def test_explain_indexes_command_passes():
+    result = app.test_cli_runner().invoke(args=['explain-indexes'])
+    assert result.exit_code == 0, result.output
+    assert '[MISSING]' not in result.output
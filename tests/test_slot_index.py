@@ -0,0 +1,38 @@
+# the per-worker availability bitmap follows bookings made by any worker
+from datetime import datetime, timedelta
+from sqlalchemy import insert, delete
+from app import app
+from models.dbmodel import db, User, ParkingLot, ParkingSpot, UserBookings, bump_versions
+from controllers.change_versions import check_change_versions
+from controllers.slot_index import find_free_spot_ids, invalidate_lot_index
+
+
+def test_booking_from_another_worker_drops_the_bitmap():
+    with app.app_context():
+        lot = ParkingLot(area_type='Open', city='Slot', primelocation_name='Slot Test', price_per_hr=1.0,
+                         address='slot index test', pincode='000001')
+        db.session.add(lot)
+        db.session.flush()
+        spot = ParkingSpot(lot_id=lot.lot_id, status='A')
+        db.session.add(spot)
+        db.session.commit()
+        lot_id, spot_id = lot.lot_id, spot.spot_id
+        user_id = User.query.first().user_id
+        start = datetime.now().replace(second=0, microsecond=0) + timedelta(days=1)
+        end = start + timedelta(hours=2)
+        check_change_versions(force=True)
+        try:
+            assert find_free_spot_ids(lot_id, start, end) == [spot_id] # bitmap built
+
+            # another worker books the only spot: the row plus its version bump, nothing in this worker's bitmap
+            db.session.execute(insert(UserBookings).values(user_id=user_id, spot_id=spot_id, parking_time=start,
+                                                           leaving_time=end, parking_cost=1, vehicle_no='OTHER'))
+            bump_versions('bookings')
+            db.session.commit()
+            check_change_versions(force=True)
+
+            assert find_free_spot_ids(lot_id, start, end) == []
+        finally:
+            db.session.execute(delete(ParkingLot).where(ParkingLot.lot_id == lot_id))
+            db.session.commit()
+            invalidate_lot_index(lot_id)
@@ -0,0 +1,42 @@
+# the sweeper's skip path: no statement at all until a booking event is due
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import app
+from models.dbmodel import db
+from controllers import sweeper
+
+
+def count_statements(run):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            run()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+            db.session.remove()
+    return statements
+
+
+def test_skipped_sweep_issues_no_query(monkeypatch):
+    now = datetime.now()
+    monkeypatch.setattr(sweeper, '_next_event_at', now + timedelta(hours=1))
+    monkeypatch.setattr(sweeper, '_last_sweep_at', now)
+    skipped = sweeper.get_sweep_stats()['skipped']
+
+    assert count_statements(sweeper.update_spot_statuses_and_counts) == []
+    assert sweeper.get_sweep_stats()['skipped'] == skipped + 1
+
+
+def test_sweep_runs_after_max_skip(monkeypatch):
+    now = datetime.now()
+    monkeypatch.setattr(sweeper, '_next_event_at', now + timedelta(hours=1))
+    monkeypatch.setattr(sweeper, '_last_sweep_at', now - timedelta(seconds=app.config['SWEEPER_MAX_SKIP_SECONDS'] + 1))
+    executed = sweeper.get_sweep_stats()['executed']
+
+    assert count_statements(sweeper.update_spot_statuses_and_counts)
+    assert sweeper.get_sweep_stats()['executed'] == executed + 1
@@ -0,0 +1,23 @@
+# the activity write of a user page leaves the request user loaded
+from datetime import datetime, timedelta
+from sqlalchemy import inspect, select, update
+from app import app
+from models.dbmodel import db, User
+from controllers import user_purge
+from controllers.user_cache import get_request_user
+
+
+def test_activity_write_does_not_expire_the_request_user(monkeypatch):
+    monkeypatch.setattr(user_purge, '_last_touched', {})
+    with app.test_request_context():
+        user_id = User.query.first().user_id
+        long_ago = datetime.now() - timedelta(days=400)
+        db.session.execute(update(User).where(User.user_id == user_id).values(last_active_at=long_ago))
+        db.session.commit()
+
+        user = get_request_user(user_id)
+        user_purge.note_user_activity(user_id)
+
+        assert not inspect(user).expired_attributes
+        assert db.session.scalar(select(User.last_active_at).where(User.user_id == user_id)) > long_ago
+        db.session.remove()